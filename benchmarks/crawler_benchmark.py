@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import configparser
+
+# Бенчмарк парсерів без звернень до fruugo.co.uk: запускає локальний замінник сайту
+# (benchmarks/fruugo_server.py) та проганяє на ньому utils.parser_async і utils.parser.
+# Кожен парсер виконується в окремому процесі, щоб пікова пам'ять і час CPU не змішувались.
+# Запуск з кореня репозиторію: python benchmarks/crawler_benchmark.py --parser both
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fruugo_server import Catalog, start_in_thread
+from benchmarks.process_usage import cpu_seconds, peak_rss_mb, format_value
+
+# Функція для створення config.ini бенчмарку: налаштування репозиторію з перевизначеними параметрами парсера
+def write_config(directory, overrides):
+    config = configparser.ConfigParser()
+    config.read(os.path.join(REPO_ROOT, 'config.ini'))
+    for section in ('PARSER', 'METRICS'):
+        if not config.has_section(section):
+            config.add_section(section)
+
+    for key, value in overrides.items():
+        config['PARSER'][key] = str(value)
+    config['METRICS']['enabled'] = 'false'
+
+    with open(os.path.join(directory, 'config.ini'), 'w', encoding='utf-8') as f:
+        config.write(f)
+
+# Запуск одного парсера в поточному (дочірньому) процесі. Викликається з робочої директорії з config.ini бенчмарку
+def run_worker(kind, categories):
+    products = 0
+
+    def count_products(data):
+        nonlocal products
+        products += len(data) if isinstance(data, list) else 1
+
+    started = time.perf_counter()
+    if kind == 'async':
+        import asyncio
+        from utils import parser_async
+        asyncio.run(parser_async.collect_product_data(categories, count_products))
+    else:
+        from utils import parser
+        parser.collect_product_data(categories, count_products)
+    wall = time.perf_counter() - started
+
+    cpu, children_cpu = cpu_seconds()
+    result = {
+        "products": products,
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "children_cpu_seconds": children_cpu,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    print("RESULT " + json.dumps(result))
+
+# Запуск парсера в окремому процесі та збір результатів
+def run_benchmark(kind, catalog, overrides, verbose=False):
+    with tempfile.TemporaryDirectory(prefix='crawler-bench-') as directory:
+        write_config(directory, overrides)
+        catalog.reset()
+
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', kind, '--categories-json', json.dumps(catalog.category_urls())],
+            cwd=directory,
+            stdout=subprocess.PIPE,
+            stderr=None if verbose else subprocess.DEVNULL,
+            text=True,
+        )
+
+    result = None
+    for line in process.stdout.splitlines():
+        if line.startswith("RESULT "):
+            result = json.loads(line[len("RESULT "):])
+        elif verbose:
+            print(line)
+    if result is None:
+        raise RuntimeError(f"Парсер {kind} завершився без результату (код {process.returncode})")
+
+    requests = sum(catalog.stats.values())
+    result.update({
+        "parser": kind,
+        "requests": requests,
+        "statuses": dict(catalog.stats),
+        "products_per_second": result["products"] / result["wall_seconds"] if result["wall_seconds"] else 0,
+        "requests_per_product": requests / result["products"] if result["products"] else None,
+        "expected_products": catalog.total_products(),
+    })
+    return result
+
+def print_results(results):
+    print()
+    print(f"{'Парсер':<8} {'Продукти':>9} {'Час, с':>8} {'Прод/с':>8} {'Запитів/прод':>13} {'CPU, с':>8} {'CPU дочірніх':>13} {'RSS, МБ':>8}")
+    for r in results:
+        requests_per_product = f"{r['requests_per_product']:.2f}" if r['requests_per_product'] is not None else '-'
+        print(
+            f"{r['parser']:<8} {r['products']:>4}/{r['expected_products']:<4} {r['wall_seconds']:>8.2f} {r['products_per_second']:>8.2f} "
+            f"{requests_per_product:>13} {format_value(r['cpu_seconds'], 8)} {format_value(r['children_cpu_seconds'], 13)} {format_value(r['peak_rss_mb'], 8, 1)}"
+        )
+    for r in results:
+        print(f"  {r['parser']}: запити за типом - {r['statuses']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк парсерів на локальному заміннику Fruugo")
+    parser.add_argument('--parser', choices=['async', 'sync', 'both'], default='both')
+    parser.add_argument('--categories', type=int, default=4)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--products', type=int, default=24, help="продуктів на сторінці")
+    parser.add_argument('--variations', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.05, help="затримка відповіді сервера, с")
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="частка відповідей 503")
+    parser.add_argument('--max-inflight', type=int, default=0, help="поріг одночасних запитів, після якого сервер відповідає 429")
+    parser.add_argument('--page-kb', type=int, default=100, help="розмір наповнювача сторінки, КБ")
+    parser.add_argument('--max-threads', type=int, default=8)
+    parser.add_argument('--product-workers', type=int, default=8)
+    parser.add_argument('--page-workers', type=int, default=4)
+    parser.add_argument('--parse-processes', type=int, default=0)
+    parser.add_argument('--html-engine', choices=['lxml', 'bs4'], default='lxml')
+    parser.add_argument('--requests-per-second', type=float, default=0, help="0 - без обмеження частоти")
+    parser.add_argument('--json', help="файл для збереження результатів у JSON")
+    parser.add_argument('--verbose', action='store_true', help="показувати вивід парсерів")
+    parser.add_argument('--worker', choices=['async', 'sync'], help=argparse.SUPPRESS)
+    parser.add_argument('--categories-json', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, json.loads(args.categories_json))
+        sys.exit(0)
+
+    catalog = Catalog(args.categories, args.pages, args.products, args.variations, args.latency, args.jitter,
+                      args.error_rate, args.max_inflight, args.page_kb)
+    stop = start_in_thread(catalog)
+
+    overrides = {
+        'max_threads': args.max_threads,
+        'product_workers': args.product_workers,
+        'page_workers': args.page_workers,
+        'parse_processes': args.parse_processes,
+        'html_engine': args.html_engine,
+        'requests_per_second': args.requests_per_second,
+        'use_proxy': 'false',
+        'use_cache': 'false',
+        'resume_crawl': 'false',
+        'incremental': 'false',
+        'persist_seen_products': 'false',
+    }
+
+    kinds = ['async', 'sync'] if args.parser == 'both' else [args.parser]
+    results = []
+    try:
+        for kind in kinds:
+            print(f"🌐 {kind}: {catalog.total_products()} продуктів, {args.categories} категорій")
+            results.append(run_benchmark(kind, catalog, overrides, args.verbose))
+    finally:
+        stop()
+
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
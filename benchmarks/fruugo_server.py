@@ -0,0 +1,190 @@
+import random
+import asyncio
+import threading
+import argparse
+from aiohttp import web
+
+# Локальний замінник Fruugo для бенчмарків: синтетичні сторінки категорій, продуктів та варіацій
+# з тією ж розміткою, яку очікують селектори з utils/extractors.py. Посилання абсолютні (на цей сервер),
+# тому парсер не звертається до fruugo.co.uk
+
+# Налаштування каталогу та поведінки сервера
+class Catalog:
+    def __init__(self, categories=4, pages=5, products_per_page=24, variations=3, latency=0.05, jitter=0.02,
+                 error_rate=0.0, max_inflight=0, page_kb=100, seed=1):
+        self.categories = categories
+        self.pages = pages
+        self.products_per_page = products_per_page
+        self.variations = variations
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_inflight = max_inflight
+        self.page_kb = page_kb
+        self.random = random.Random(seed)
+        self.base_url = None
+
+        self.inflight = 0
+        self.stats = {}
+
+        # Наповнювач сторінки, щоб розмір та вартість розбору були близькі до справжніх сторінок
+        block = '<div class="footer-links"><ul>' + ''.join(f'<li><a href="/help/{i}">Help topic {i}</a></li>' for i in range(10)) + '</ul></div>'
+        self.filler = block * max(1, page_kb * 1024 // len(block)) if page_kb else ''
+
+    # URL категорій для передачі в collect_product_data
+    def category_urls(self):
+        return [f"{self.base_url}/c{index}" for index in range(self.categories)]
+
+    # Загальна кількість унікальних продуктів у каталозі
+    def total_products(self):
+        return self.categories * self.pages * self.products_per_page
+
+    def product_id(self, category, page, position):
+        return 100000 + (category * self.pages + page - 1) * self.products_per_page + position
+
+    def count(self, key):
+        self.stats[key] = self.stats.get(key, 0) + 1
+
+    def reset(self):
+        self.stats = {}
+
+    def page(self, body):
+        return f'<!DOCTYPE html><html><head><title>Fruugo</title></head><body>{body}{self.filler}</body></html>'
+
+    def listing(self, category, page):
+        base = f"{self.base_url}/c{category}?pageSize=128"
+        links = ''.join(
+            f'<div class="product-item"><a href="{self.base_url}/item-c{category}-{position}/p-{self.product_id(category, page, position)}">'
+            f'<span>Product {position}</span></a></div>'
+            for position in range(self.products_per_page)
+        )
+        pagination = ''.join(f'<a href="{base}&page={number}">{number}</a>' for number in range(1, self.pages + 1))
+        if page < self.pages:
+            next_link = f'<a class="next-page" href="{base}&page={page + 1}">Next</a>'
+        else:
+            next_link = '<a class="next-page disabled">Next</a>'
+        return self.page(
+            f'<div class="products-list">{links}</div>'
+            f'<div class="pagination">{pagination}{next_link}</div>'
+        )
+
+    def product(self, product_id, variation_id=None):
+        ids = [str(product_id * 10 + index) for index in range(self.variations)]
+        options = ''.join(f'<option value="[{", ".join(ids[index:index + 2])}]">Option {index}</option>' for index in range(len(ids)))
+        size = f'<label for="Size">Size: <span>Size {variation_id}</span></label>' if variation_id else ''
+        colour = f'<label for="Colour">Colour: <span>Red</span></label>' if variation_id else ''
+        thumbs = ''.join(
+            f'<button class="js-gallery-thumb" data-image="https://img.example/{product_id}-{variation_id}-{index}.jpg"></button>'
+            for index in range(2)
+        ) if variation_id else ''
+        return self.page(f'''
+<div id="main"><div class="Product">
+<div class="Product__Top"><ol class="breadcrumb">
+<li class="breadcrumb-item"><a href="/">Home</a></li><li class="breadcrumb-item"><a href="/toys">Toys &amp; Games</a></li>
+<li class="breadcrumb-item"><a href="/toys/puzzles">Puzzles</a></li></ol>
+<div class="Product__Gallery"><div class="ProductGallery js-hover-zoom"><img src="https://img.example/{product_id}.jpg"></div></div>{thumbs}</div>
+<div class="Product__Details"><div class="Product__Title">{size}{colour}</div>
+<h1 class="js-product-title">Product {product_id}</h1>
+<div class="Product__Price"><del>£24.99</del></div><span class="js-meta-price">£19.99</span>
+<select class="custom-select">{options}</select></div>
+<div class="Product__BuyBox"><strong>In stock</strong></div>
+</div></div>
+<div id="description"><p>Description of product {product_id}.</p><ul><li>Feature one</li><li>Feature two</li></ul></div>
+<ul class="product-description-spec-list"><li><strong>Brand</strong><span>Acme</span></li><li><strong>EAN</strong><span>{product_id}</span></li></ul>''')
+
+# Створення aiohttp-застосунку для каталогу
+def make_app(catalog):
+    async def handle(request):
+        if catalog.max_inflight and catalog.inflight >= catalog.max_inflight:
+            catalog.count('429')
+            return web.Response(status=429, headers={'Retry-After': '1'})
+        if catalog.error_rate and catalog.random.random() < catalog.error_rate:
+            catalog.count('503')
+            return web.Response(status=503)
+
+        catalog.inflight += 1
+        try:
+            await asyncio.sleep(max(0.0, catalog.latency + catalog.random.uniform(-catalog.jitter, catalog.jitter)))
+        finally:
+            catalog.inflight -= 1
+
+        path = request.path.strip('/')
+        if path.startswith('c') and path[1:].isdigit():
+            catalog.count('listing')
+            body = catalog.listing(int(path[1:]), int(request.query.get('page', '1')))
+        elif '/p-' in path:
+            ids = path.rsplit('/p-', 1)[1].split('-')
+            if len(ids) == 2:
+                catalog.count('variation')
+                body = catalog.product(int(ids[0]), int(ids[1]))
+            else:
+                catalog.count('product')
+                body = catalog.product(int(ids[0]))
+        else:
+            catalog.count('404')
+            raise web.HTTPNotFound()
+
+        return web.Response(text=body, content_type='text/html')
+
+    async def stats(request):
+        return web.json_response(catalog.stats)
+
+    app = web.Application()
+    app.router.add_get('/__stats', stats)
+    app.router.add_get('/{tail:.*}', handle)
+    return app
+
+# Запуск сервера у фоновому потоці з власним циклом подій. Повертає функцію зупинки
+def start_in_thread(catalog, port=0):
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    state = {}
+
+    async def run():
+        runner = web.AppRunner(make_app(catalog), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', port)
+        await site.start()
+        state['runner'] = runner
+        state['port'] = runner.addresses[0][1]
+        started.set()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(run())
+        loop.run_forever()
+        loop.run_until_complete(state['runner'].cleanup())
+        loop.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    started.wait()
+    catalog.base_url = f"http://127.0.0.1:{state['port']}"
+
+    def stop():
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return stop
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальний замінник Fruugo для бенчмарків")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--categories', type=int, default=4)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--products', type=int, default=24, help="продуктів на сторінці")
+    parser.add_argument('--variations', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--max-inflight', type=int, default=0)
+    parser.add_argument('--page-kb', type=int, default=100)
+    args = parser.parse_args()
+
+    catalog = Catalog(args.categories, args.pages, args.products, args.variations, args.latency, args.jitter,
+                      args.error_rate, args.max_inflight, args.page_kb)
+    catalog.base_url = f"http://127.0.0.1:{args.port}"
+    print("🌐 Категорії:")
+    for url in catalog.category_urls():
+        print(f"  {url}")
+    web.run_app(make_app(catalog), host='127.0.0.1', port=args.port, print=None)
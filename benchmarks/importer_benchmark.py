@@ -0,0 +1,197 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+import configparser
+from urllib.parse import urlparse
+
+# Бенчмарк імпортера без живого магазину: запускає локальний замінник WooCommerce REST API
+# (benchmarks/woocommerce_server.py) та проганяє utils.importer.import_batch на збережених батчах
+# (.json, .ndjson, .ndjson.gz, .ndjson.zst) або на згенерованих продуктах.
+# Запуск з кореня репозиторію: python benchmarks/importer_benchmark.py data/batches/*.ndjson.gz
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.woocommerce_server import Shop, start_in_thread
+from utils.ndjson import read_products
+from benchmarks.process_usage import cpu_seconds, format_value
+
+# Кольори та розміри для згенерованих продуктів (назви кольорів мають бути відомі webcolors)
+COLORS = ['Red', 'Blue', 'Green', 'Black', 'White', 'Navy', 'Pink', 'Orange', 'Purple', 'Gray']
+SIZES = ['XS', 'S', 'M', 'L', 'XL', 'XXL', '36', '38', '40', '42']
+BREADCRUMBS = [
+    'Home > Toys & Games > Puzzles',
+    'Home > Toys & Games > Board Games',
+    'Home > Clothing > Women > Dresses',
+    'Home > Clothing > Men > Shirts',
+    'Home > Home & Garden > Kitchen',
+]
+
+# Функція для генерації продукту у форматі, який повертають парсери
+def generate_product(index, variations, images, rng):
+    product_id = 100000 + index
+    colors = rng.sample(COLORS, min(len(COLORS), max(1, variations // 2)))
+    sizes = rng.sample(SIZES, min(len(SIZES), max(1, -(-variations // len(colors)))))
+    product_images = [f"https://img.fruugo.example/{product_id}/{n}.jpg" for n in range(images)]
+
+    product_variations = []
+    for n in range(variations):
+        product_variations.append({
+            "sku": f"SKU-{product_id}-{n}",
+            "size": sizes[n % len(sizes)],
+            "color": colors[n % len(colors)],
+            "availability": True,
+            "images": [product_images[n % len(product_images)]] if product_images else [],
+        })
+
+    return {
+        "title": f"Product {product_id}",
+        "url": f"https://www.fruugo.co.uk/product-{index}/p-{product_id}",
+        "regular_price": 24.99,
+        "sale_price": 19.99,
+        "description": f"<div id=\"description\"><p>Description of product {product_id}</p></div>",
+        "categories": BREADCRUMBS[index % len(BREADCRUMBS)],
+        "images": product_images,
+        "brand": "Acme",
+        "variations": product_variations,
+    }
+
+# Функція для створення config.ini бенчмарку: налаштування репозиторію без файлів метрик.
+# Імпортер запускається в тимчасовій директорії, тому індекси термінів, категорій та медіа з ID магазину-замінника
+# не потрапляють у data/ репозиторію, звідки їх прочитав би наступний справжній імпорт
+def write_config(directory):
+    config = configparser.ConfigParser()
+    config.read(os.path.join(REPO_ROOT, 'config.ini'))
+    if not config.has_section('METRICS'):
+        config.add_section('METRICS')
+    config['METRICS']['enabled'] = 'false'
+
+    with open(os.path.join(directory, 'config.ini'), 'w', encoding='utf-8') as f:
+        config.write(f)
+
+# Функція для завантаження продуктів з файлів батчів
+def load_products(paths):
+    products = []
+    for path in paths:
+        if path.endswith('.json'):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            products.extend(data if isinstance(data, list) else [data])
+        else:
+            products.extend(read_products(path))
+    return products
+
+# Посилання на зображення перенаправляються на /__cdn замінника, зі збереженням хоста та шляху
+def rewrite_images(products, base_url):
+    def rewrite(url):
+        parsed = urlparse(url)
+        return f"{base_url}/__cdn/{parsed.netloc}{parsed.path}"
+
+    for product in products:
+        product["images"] = [rewrite(url) for url in product.get("images", [])]
+        for variation in product.get("variations", []):
+            variation["images"] = [rewrite(url) for url in variation.get("images", [])]
+
+def print_results(result):
+    print()
+    print(f"Продуктів: {result['products']}, батчів: {result['batches']}, час: {result['wall_seconds']:.2f} с, "
+          f"{result['products_per_second']:.2f} прод/с, CPU: {format_value(result['cpu_seconds'], 0)} с")
+    print(f"HTTP-запитів: {result['requests']} ({result['requests_per_product']:.2f} на продукт), "
+          f"медіа: {result['bytes_uploaded'] / 1024 / 1024:.2f} МБ, всього відправлено: {result['bytes_sent'] / 1024 / 1024:.2f} МБ")
+    print()
+    print(f"{'Ендпоінт':<62} {'Запитів':>8} {'На прод.':>9} {'Вхідні, КБ':>11}")
+    for label, count in sorted(result["endpoints"].items(), key=lambda item: -item[1]):
+        print(f"{label:<62} {count:>8} {count / result['products']:>9.2f} {result['bytes_in'].get(label, 0) / 1024:>11.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк імпортера на локальному заміннику WooCommerce")
+    parser.add_argument('batches', nargs='*', help="файли батчів; якщо не вказано, продукти генеруються")
+    parser.add_argument('--generate', type=int, default=50, help="кількість згенерованих продуктів")
+    parser.add_argument('--variations', type=int, default=4)
+    parser.add_argument('--images', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.05, help="затримка відповіді API, с")
+    parser.add_argument('--batch-item-latency', type=float, default=0.01, help="додаткова затримка на елемент batch-запиту, с")
+    parser.add_argument('--media-latency', type=float, default=0.1, help="затримка завантаження медіа, с")
+    parser.add_argument('--image-kb', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="файл для збереження результатів у JSON")
+    parser.add_argument('--verbose', action='store_true', help="показувати вивід імпортера")
+    args = parser.parse_args()
+
+    shop = Shop(args.latency, args.batch_item_latency, args.media_latency, args.image_kb)
+    stop = start_in_thread(shop)
+
+    # Імпортер читає WC_URL та ключі з оточення при імпорті і одразу звертається до API за атрибутами
+    os.environ.update({
+        "WC_URL": shop.base_url,
+        "WC_KEY": "ck_benchmark",
+        "WC_SECRET": "cs_benchmark",
+        "WC_USERNAME": "benchmark",
+        "WC_PASSWORD": "benchmark",
+    })
+    cwd = os.getcwd()
+    directory = tempfile.TemporaryDirectory(prefix='importer-bench-')
+
+    try:
+        if args.batches:
+            products = load_products(args.batches)
+        else:
+            rng = random.Random(args.seed)
+            products = [generate_product(index, args.variations, args.images, rng) for index in range(args.generate)]
+        rewrite_images(products, shop.base_url)
+
+        write_config(directory.name)
+        os.chdir(directory.name)
+
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        errors = contextlib.nullcontext() if args.verbose else contextlib.redirect_stderr(io.StringIO())
+        with output, errors:
+            from utils import importer
+
+            shop.reset_stats()
+            cpu_before, _ = cpu_seconds()
+            started = time.perf_counter()
+            batches = 0
+            for start in range(0, len(products), args.batch_size):
+                importer.import_batch(products[start:start + args.batch_size])
+                batches += 1
+            wall = time.perf_counter() - started
+            cpu_after, _ = cpu_seconds()
+
+            # Реєстр медіа тримає файл відкритим, а у Windows відкритий файл не дає видалити директорію
+            if importer.media_registry is not None:
+                importer.media_registry.close()
+    finally:
+        stop()
+        os.chdir(cwd)
+        directory.cleanup()
+
+    requests = sum(shop.stats.values())
+    result = {
+        "products": len(products),
+        "batches": batches,
+        "wall_seconds": wall,
+        # CPU процесу включає й потік сервера-замінника
+        "cpu_seconds": cpu_after - cpu_before if cpu_before is not None else None,
+        "products_per_second": len(products) / wall if wall else 0,
+        "requests": requests,
+        "requests_per_product": requests / len(products) if products else 0,
+        "bytes_uploaded": shop.bytes_in.get('POST /wp-json/wp/v2/media', 0),
+        "bytes_sent": sum(shop.bytes_in.values()),
+        "endpoints": dict(shop.stats),
+        "bytes_in": dict(shop.bytes_in),
+        "created_products": len(shop.products),
+        "created_variations": len(shop.variations),
+    }
+
+    print_results(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,39 @@
+import sys
+
+# resource є лише в Unix. У Windows показники беруться з psutil (необов'язкова залежність),
+# а якщо його немає, час CPU та пікова пам'ять у результатах бенчмарків пропускаються (None)
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Функція для отримання часу CPU поточного процесу та його завершених дочірніх процесів, с
+def cpu_seconds():
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime, children.ru_utime + children.ru_stime
+    if psutil is not None:
+        times = psutil.Process().cpu_times()
+        return times.user + times.system, times.children_user + times.children_system
+    return None, None
+
+# Функція для отримання пікової пам'яті поточного процесу, МБ
+def peak_rss_mb():
+    if resource is not None:
+        # ru_maxrss у Linux - кілобайти, у macOS - байти
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        # peak_wset є лише у Windows, на інших системах psutil повертає поточний RSS
+        return getattr(memory, 'peak_wset', memory.rss) / (1024 * 1024)
+    return None
+
+# Функція для форматування показника в таблиці результатів ("-", якщо його не вдалося виміряти)
+def format_value(value, width, digits=2):
+    return f"{value:>{width}.{digits}f}" if value is not None else f"{'-':>{width}}"
@@ -0,0 +1,246 @@
+import re
+import asyncio
+import argparse
+import threading
+from aiohttp import web
+
+# Локальний замінник WooCommerce REST API для бенчмарків імпортера. Зберігає атрибути, терміни,
+# категорії, товари та медіа в пам'яті й рахує кількість запитів та байти за кожним ендпоінтом.
+# Також віддає "зображення з CDN" (/__cdn/...), щоб завантаження картинок не виходило в інтернет
+
+# Стан магазину та налаштування затримок
+class Shop:
+    def __init__(self, latency=0.05, batch_item_latency=0.01, media_latency=0.1, image_kb=60):
+        self.latency = latency
+        self.batch_item_latency = batch_item_latency
+        self.media_latency = media_latency
+        self.image = b'\xff\xd8\xff\xe0' + b'\0' * max(image_kb * 1024 - 4, 0)
+        self.base_url = None
+
+        self.attributes = [{"id": 1, "name": "Color", "slug": "pa_color"}, {"id": 2, "name": "Size", "slug": "pa_size"}]
+        self.terms = {1: [], 2: []}
+        self.categories = []
+        self.products = {}
+        self.variations = {}
+        self.media = {}
+        self.color_meta = {}
+        self.next_id = 1000
+
+        self.stats = {}
+        self.bytes_in = {}
+        self.bytes_out = {}
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def reset_stats(self):
+        self.stats = {}
+        self.bytes_in = {}
+        self.bytes_out = {}
+
+    # Терміни атрибуту: створення або помилка term_exists, як у WooCommerce
+    def create_term(self, attribute_id, name):
+        for term in self.terms[attribute_id]:
+            if term["name"].lower() == name.lower():
+                return 400, {"code": "term_exists", "message": "A term with the name provided already exists.", "data": {"status": 400, "resource_id": term["id"]}}
+        term = {"id": self.new_id(), "name": name, "slug": name.lower().replace(' ', '-')}
+        self.terms[attribute_id].append(term)
+        return 201, term
+
+    def create_category(self, name, parent):
+        for category in self.categories:
+            if category["name"].lower() == name.lower() and category["parent"] == parent:
+                return 400, {"code": "term_exists", "message": "A term with the name provided already exists.", "data": {"status": 400, "resource_id": category["id"]}}
+        category = {"id": self.new_id(), "name": name, "slug": name.lower().replace(' ', '-'), "parent": parent}
+        self.categories.append(category)
+        return 201, category
+
+# Функція для нормалізації шляху запиту в мітку ендпоінта (ID замінюються на {id})
+def endpoint_label(method, path):
+    return f"{method} " + re.sub(r'/\d+(?=/|$)', '/{id}', path.rstrip('/'))
+
+# Пагінація списку так само, як у WooCommerce (per_page, page)
+def paginate(items, query):
+    per_page = int(query.get('per_page', 10))
+    page = int(query.get('page', 1))
+    return items[(page - 1) * per_page:page * per_page]
+
+# Створення aiohttp-застосунку для магазину
+def make_app(shop):
+    routes = web.RouteTableDef()
+
+    @web.middleware
+    async def accounting(request, handler):
+        body = await request.read()
+        label = endpoint_label(request.method, request.path) if not request.path.startswith('/__cdn/') else 'GET /__cdn'
+        shop.stats[label] = shop.stats.get(label, 0) + 1
+        shop.bytes_in[label] = shop.bytes_in.get(label, 0) + len(body)
+
+        await asyncio.sleep(shop.media_latency if request.path.startswith('/wp-json/wp/v2/media') else shop.latency)
+        response = await handler(request)
+        shop.bytes_out[label] = shop.bytes_out.get(label, 0) + (response.content_length or 0)
+        return response
+
+    async def batch_delay(count):
+        if shop.batch_item_latency:
+            await asyncio.sleep(shop.batch_item_latency * count)
+
+    @routes.get('/wp-json/wc/v3/products/attributes')
+    async def attributes(request):
+        return web.json_response(shop.attributes)
+
+    @routes.get('/wp-json/wc/v3/products/attributes/{attribute_id}/terms')
+    async def list_terms(request):
+        terms = shop.terms.get(int(request.match_info['attribute_id']), [])
+        if request.query.get('orderby') == 'id':
+            terms = sorted(terms, key=lambda t: t["id"], reverse=request.query.get('order') == 'desc')
+        return web.json_response(paginate(terms, request.query), headers={'X-WP-Total': str(len(terms))})
+
+    @routes.post('/wp-json/wc/v3/products/attributes/{attribute_id}/terms')
+    async def create_term(request):
+        data = await request.json()
+        status, body = shop.create_term(int(request.match_info['attribute_id']), data["name"])
+        return web.json_response(body, status=status)
+
+    @routes.post('/wp-json/wc/v3/products/attributes/{attribute_id}/terms/batch')
+    async def batch_terms(request):
+        data = await request.json()
+        attribute_id = int(request.match_info['attribute_id'])
+        items = data.get("create", [])
+        if len(items) > 100:
+            return web.json_response({"code": "rest_request_entity_too_large", "message": "Unable to accept more than 100 items for this request."}, status=413)
+        await batch_delay(len(items))
+
+        created = []
+        for item in items:
+            status, body = shop.create_term(attribute_id, item["name"])
+            created.append(body if status == 201 else {"id": 0, "error": body})
+        return web.json_response({"create": created})
+
+    @routes.get('/wp-json/wc/v3/products/categories')
+    async def list_categories(request):
+        categories = shop.categories
+        search = request.query.get('search')
+        if search:
+            categories = [c for c in categories if search.lower() in c["name"].lower()]
+        if 'parent' in request.query:
+            categories = [c for c in categories if c["parent"] == int(request.query['parent'])]
+        if request.query.get('orderby') == 'id':
+            categories = sorted(categories, key=lambda c: c["id"], reverse=request.query.get('order') == 'desc')
+        return web.json_response(paginate(categories, request.query), headers={
+            'X-WP-Total': str(len(categories)),
+            'X-WP-TotalPages': str(max(1, -(-len(categories) // int(request.query.get('per_page', 10))))),
+        })
+
+    @routes.post('/wp-json/wc/v3/products/categories')
+    async def create_category(request):
+        data = await request.json()
+        status, body = shop.create_category(data["name"], data.get("parent", 0))
+        return web.json_response(body, status=status)
+
+    @routes.post('/wp-json/wc/v3/products/batch')
+    async def batch_products(request):
+        data = await request.json()
+        items = data.get("create", [])
+        await batch_delay(len(items))
+
+        created = []
+        for item in items:
+            product = {"id": shop.new_id(), **item}
+            shop.products[product["id"]] = product
+            created.append(product)
+        return web.json_response({"create": created})
+
+    @routes.post('/wp-json/wc/v3/products/{product_id}/variations/batch')
+    async def batch_variations(request):
+        data = await request.json()
+        items = data.get("create", [])
+        await batch_delay(len(items))
+
+        created = []
+        for item in items:
+            variation = {"id": shop.new_id(), **item}
+            shop.variations[variation["id"]] = variation
+            created.append(variation)
+        return web.json_response({"create": created})
+
+    @routes.post('/wp-json/wp/v2/media')
+    async def upload_media(request):
+        body = await request.read()
+        media_id = shop.new_id()
+        shop.media[media_id] = len(body)
+        return web.json_response({"id": media_id, "source_url": f"{shop.base_url}/wp-content/uploads/{media_id}.jpg"}, status=201)
+
+    @routes.get('/wp-json/wp/v2/media/{media_id}')
+    async def get_media(request):
+        media_id = int(request.match_info['media_id'])
+        if media_id not in shop.media:
+            return web.json_response({"code": "rest_post_invalid_id", "message": "Invalid post ID."}, status=404)
+        return web.json_response({"id": media_id})
+
+    @routes.post('/wp-json/custom/v1/set-color-meta/')
+    async def set_color_meta(request):
+        data = await request.json()
+        shop.color_meta[data["term_id"]] = data["hex"]
+        return web.json_response({"success": True})
+
+    @routes.get('/__cdn/{tail:.*}')
+    async def cdn_image(request):
+        # Вміст кожного зображення унікальний (за шляхом), щоб дедуплікація за хешем не спрацьовувала на всіх
+        return web.Response(body=shop.image + request.path.encode(), content_type='image/jpeg')
+
+    @routes.get('/__stats')
+    async def stats(request):
+        return web.json_response({"requests": shop.stats, "bytes_in": shop.bytes_in, "bytes_out": shop.bytes_out})
+
+    app = web.Application(middlewares=[accounting], client_max_size=64 * 1024 * 1024)
+    app.add_routes(routes)
+    return app
+
+# Запуск сервера у фоновому потоці з власним циклом подій. Повертає функцію зупинки
+def start_in_thread(shop, port=0):
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    state = {}
+
+    async def run():
+        runner = web.AppRunner(make_app(shop), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', port)
+        await site.start()
+        state['runner'] = runner
+        state['port'] = runner.addresses[0][1]
+        started.set()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(run())
+        loop.run_forever()
+        loop.run_until_complete(state['runner'].cleanup())
+        loop.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    started.wait()
+    shop.base_url = f"http://127.0.0.1:{state['port']}"
+
+    def stop():
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return stop
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальний замінник WooCommerce REST API для бенчмарків")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--batch-item-latency', type=float, default=0.01)
+    parser.add_argument('--media-latency', type=float, default=0.1)
+    parser.add_argument('--image-kb', type=int, default=60)
+    args = parser.parse_args()
+
+    shop = Shop(args.latency, args.batch_item_latency, args.media_latency, args.image_kb)
+    shop.base_url = f"http://127.0.0.1:{args.port}"
+    print(f"🌐 WC_URL={shop.base_url}")
+    web.run_app(make_app(shop), host='127.0.0.1', port=args.port, print=None)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Тести запускаються з кореня репозиторію: python -m pytest tests
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
@@ -0,0 +1,91 @@
+import os
+import itertools
+import lxml.html
+import pytest
+from utils import extractors
+
+# Паритет рушіїв розбору: на збережених сторінках (tests/fixtures) усі комбінації html_engine
+# та region_parsing мають давати однакові дані
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+MODES = list(itertools.product(['lxml', 'bs4'], [True, False]))
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+# Структура HTML без різниці в записі порожніх тегів (<br> / <br/>) та порядку атрибутів
+def html_structure(markup):
+    def walk(element):
+        return (
+            element.tag,
+            sorted(element.attrib.items()),
+            (element.text or '').strip(),
+            [walk(child) for child in element],
+            (element.tail or '').strip(),
+        )
+    return walk(lxml.html.fragment_fromstring(markup))
+
+def extract(monkeypatch, engine, regions, extractor, *args):
+    monkeypatch.setattr(extractors, 'html_engine', engine)
+    monkeypatch.setattr(extractors, 'region_parsing', regions)
+    return extractor(*args)
+
+def all_modes(monkeypatch, extractor, *args):
+    return {mode: extract(monkeypatch, *mode, extractor, *args) for mode in MODES}
+
+@pytest.mark.parametrize('name', ['listing.html', 'listing_last.html'])
+def test_listing_parity(monkeypatch, name):
+    results = all_modes(monkeypatch, extractors.extract_listing, read_fixture(name))
+    expected = results[('lxml', False)]
+    for mode, result in results.items():
+        assert result == expected, mode
+
+def test_listing_values(monkeypatch):
+    result = extract(monkeypatch, 'lxml', True, extractors.extract_listing, read_fixture('listing.html'))
+    assert result["last_page_number"] == 17
+    assert result["next_page_url"] == 'https://www.fruugo.co.uk/puzzles/d-ws12?page=2'
+    assert result["product_urls"] == [
+        'https://www.fruugo.co.uk/ravensburger-1000-piece-puzzle/p-12345678-26543210',
+        'https://www.fruugo.co.uk/wooden-jigsaw-puzzle-for-kids/p-22345678',
+        'https://www.fruugo.co.uk/3d-crystal-puzzle/p-32345678-46543210',
+        'https://www.fruugo.co.uk/puzzle-mat/p-42345678',
+    ]
+
+    last = extract(monkeypatch, 'lxml', True, extractors.extract_listing, read_fixture('listing_last.html'))
+    assert last["next_page_url"] is None
+
+def test_product_parity(monkeypatch):
+    url = 'https://www.fruugo.co.uk/ravensburger-1000-piece-puzzle/p-12345678'
+    results = all_modes(monkeypatch, extractors.extract_product, read_fixture('product.html'), url)
+    expected = dict(results[('lxml', False)])
+    expected_description = html_structure(expected.pop("description"))
+    for mode, result in results.items():
+        result = dict(result)
+        assert html_structure(result.pop("description")) == expected_description, mode
+        assert result == expected, mode
+
+    assert expected["title"] == 'Ravensburger 1000 Piece Puzzle - Kittens & Puppies'
+    assert expected["regular_price"] == 24.99
+    assert expected["sale_price"] == 1019.5
+    assert expected["categories"] == 'Home > Toys & Games > Puzzles'
+    assert expected["brand"] == 'Ravensburger'
+    assert expected["variation_ids"] == ['26543210', '26543211', '26543212', '26543213']
+
+@pytest.mark.parametrize('name, expected', [
+    ('variation.html', {
+        "size": 'M',
+        "color": 'Red',
+        "availability": True,
+        "images": ['https://img.fruugo.com/product/1/26543210_1.jpg', 'https://img.fruugo.com/product/1/26543210_2.jpg'],
+    }),
+    ('variation_single_image.html', {
+        "size": 'L',
+        "color": None,
+        "availability": False,
+        "images": ['https://img.fruugo.com/product/1/26543213_max.jpg'],
+    }),
+])
+def test_variation_parity(monkeypatch, name, expected):
+    for mode, result in all_modes(monkeypatch, extractors.extract_variation, read_fixture(name)).items():
+        assert result == expected, mode
@@ -0,0 +1,46 @@
+import asyncio
+import pytest
+from utils.retry import RetryPolicy, ResponseError, call_with_retries, call_with_retries_async
+
+# Відповіді сервера по черзі: виняток кидається, інше повертається як результат
+def scripted(responses):
+    responses = list(responses)
+
+    def request():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+    return request
+
+def test_throttled_responses_spend_no_attempts():
+    policy = RetryPolicy(max_attempts=2, base_delay=0, budget=1)
+    throttled = ResponseError(429, {'Retry-After': '0'})
+    request = scripted([throttled, throttled, throttled, ResponseError(503), 'ok'])
+
+    assert call_with_retries(policy, request) == 'ok'
+
+def test_exhausted_retries_raise_last_error():
+    policy = RetryPolicy(max_attempts=3, base_delay=0, budget=10)
+    failures = []
+    request = scripted([ResponseError(503), ConnectionError('reset'), ResponseError(502)])
+
+    with pytest.raises(ResponseError):
+        call_with_retries(policy, request, lambda e, attempt, throttled, delay: failures.append((attempt, delay is None)))
+    assert failures == [(0, False), (1, False), (2, True)]
+
+def test_permanent_status_is_not_retried():
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    request = scripted([ResponseError(404), 'ok'])
+
+    with pytest.raises(ResponseError):
+        call_with_retries(policy, request)
+
+def test_async_wrapper_matches_sync():
+    policy = RetryPolicy(max_attempts=2, base_delay=0, budget=1)
+    request = scripted([ResponseError(429, {'Retry-After': '0'}), ResponseError(503), 'ok'])
+
+    async def async_request():
+        return request()
+
+    assert asyncio.run(call_with_retries_async(policy, async_request)) == 'ok'
@@ -0,0 +1,99 @@
+import os
+import json
+import threading
+from utils.term_index import normalize_name
+
+# Функція для розбиття breadcrumb ("Home > Toys & Games > Puzzles") на назви категорій
+def split_breadcrumb(breadcrumb):
+    return [name.strip() for name in breadcrumb.split(">") if name.strip()]
+
+# Індекс дерева категорій WooCommerce: (ID батьківської категорії, нормалізована назва) -> ID.
+# Також зберігає готові відповідності breadcrumb -> ID кінцевої категорії. Якщо вказано path,
+# індекс зберігається у JSON між запусками і перевіряється при старті за кількістю категорій та ID найновішої
+class CategoryIndex:
+    def __init__(self, path=None, shop_url=None):
+        self.path = path
+        self.shop_url = shop_url
+        self.lock = threading.Lock()
+        self.categories = {}
+        self.children = {}
+        self.breadcrumbs = {}
+        self.is_loaded = False
+        self.cache = None
+
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                # Індекс іншого магазину не використовується
+                if data.get("shop_url") == shop_url:
+                    self.cache = data
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Не вдалося прочитати індекс категорій {path}: {e}")
+
+    def loaded(self):
+        return self.is_loaded
+
+    # Чи є збережений з попереднього запуску індекс
+    def cached(self):
+        return self.cache is not None
+
+    # Перевірка збереженого індексу за кількістю категорій у магазині та ID найновішої.
+    # Якщо вони збігаються, збережений індекс разом з breadcrumb стає робочим і повертається True
+    def revalidate(self, total, last_id):
+        categories = self.cache["categories"] if self.cache else None
+        if categories is None or total != len(categories) or last_id != max((c[0] for c in categories), default=0):
+            return False
+        self.replace(categories)
+        return True
+
+    # Заміна індексу повним списком категорій [(ID, ID батьківської, назва), ...].
+    # Збережені breadcrumb залишаються лише для категорій, які ще існують
+    def replace(self, categories):
+        with self.lock:
+            self.categories = {}
+            self.children = {}
+            for category_id, parent_id, name in categories:
+                self.categories[category_id] = (parent_id, name)
+                self.children.setdefault((parent_id, normalize_name(name)), category_id)
+
+            breadcrumbs = dict(self.cache.get("breadcrumbs", {})) if self.cache else {}
+            breadcrumbs.update(self.breadcrumbs)
+            self.breadcrumbs = {key: value for key, value in breadcrumbs.items() if value in self.categories}
+            self.is_loaded = True
+
+    # ID дочірньої категорії за назвою (None, якщо категорії немає)
+    def child(self, parent_id, name):
+        with self.lock:
+            return self.children.get((parent_id, normalize_name(name)))
+
+    # Додавання створеної (або знайденої через term_exists) категорії
+    def add(self, category_id, parent_id, name):
+        with self.lock:
+            self.categories[category_id] = (parent_id, name)
+            self.children[(parent_id, normalize_name(name))] = category_id
+
+    def breadcrumb(self, breadcrumb):
+        with self.lock:
+            return self.breadcrumbs.get(breadcrumb)
+
+    def set_breadcrumb(self, breadcrumb, category_id):
+        with self.lock:
+            self.breadcrumbs[breadcrumb] = category_id
+
+    # Збереження індексу на диск (через тимчасовий файл, щоб не залишити половину файлу)
+    def save(self):
+        if not self.path or not self.is_loaded:
+            return
+        with self.lock:
+            data = {
+                "shop_url": self.shop_url,
+                "categories": sorted([category_id, parent_id, name] for category_id, (parent_id, name) in self.categories.items()),
+                "breadcrumbs": dict(self.breadcrumbs),
+            }
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,138 @@
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Адаптивне обмеження кількості одночасних запитів за алгоритмом AIMD (як у TCP).
+# Поки затримка близька до базової і сервер не відповідає 429/503, ліміт росте приблизно
+# на increase за кожне "коло" з limit запитів. При перевантаженні (429/503/таймаут) або
+# затримці, яка ціле коло тримається вищою за latency_tolerance * базову, ліміт множиться на decrease, але не частіше
+# одного разу за "вікно": сигнали від запитів, розпочатих до останнього зменшення, ігноруються,
+# бо вони відправлені ще за старого ліміту. Так одна хвиля помилок не скидає ліміт до мінімуму
+# незалежно від того, скільки триває запит
+class AdaptiveLimiter:
+    def __init__(self, initial, min_limit=1, max_limit=64, increase=1.0, decrease=0.5, latency_tolerance=2.0):
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+
+        self.in_flight = 0
+        self.waiters = deque()
+        self.latency = None
+        self.base_latency = None
+        # Кількість успішних запитів поспіль, після яких затримка була вищою за допустиму
+        self.slow_streak = 0
+        # Порядковий номер останнього розпочатого запиту та номер, до якого включно запити належать вікну останнього зменшення
+        self.started = 0
+        self.window_end = 0
+
+        # Статистика для звіту
+        self.peak_limit = int(self.limit)
+        self.lowest_limit = int(self.limit)
+        self.increases = 0
+        self.decreases = 0
+        self.skipped_decreases = 0
+
+    # Поточний ліміт одночасних запитів
+    @property
+    def current(self):
+        return int(self.limit)
+
+    # Очікування вільного слоту. Повертає порядковий номер запиту для release
+    async def acquire(self):
+        while self.in_flight >= self.current:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+                self.wake()
+                raise
+        self.in_flight += 1
+        self.started += 1
+        return self.started
+
+    # Пробудження стількох задач з черги, скільки звільнилось слотів
+    def wake(self):
+        free = self.current - self.in_flight
+        while free > 0 and self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    # Звільнення слоту з результатом запиту: latency - тривалість у секундах,
+    # overloaded - сервер сигналізує про перевантаження, failed - інша помилка (ліміт не змінюється),
+    # request - порядковий номер запиту з acquire
+    def release(self, latency, overloaded=False, failed=False, request=None):
+        self.in_flight -= 1
+
+        if overloaded:
+            self.backoff(request)
+        elif not failed:
+            self.latency = latency if self.latency is None else self.latency * 0.8 + latency * 0.2
+
+            # Базова затримка - повільне згладжене середнє (приблизно за останні 50 запитів), тому звичайний
+            # розкид затримки здорового сервера її не зсуває, а стійка зміна затримки поступово стає новою нормою
+            self.base_latency = latency if self.base_latency is None else self.base_latency * 0.98 + latency * 0.02
+
+            # Одиничне перевищення (розкид затримки) ліміт не зменшує: затримка має триматися високою ціле коло з limit запитів
+            if self.latency > self.base_latency * self.latency_tolerance:
+                self.slow_streak += 1
+                if self.slow_streak >= self.current:
+                    self.slow_streak = 0
+                    self.backoff(request)
+            else:
+                self.slow_streak = 0
+                if self.limit < self.max_limit:
+                    self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+                    self.increases += 1
+                    self.peak_limit = max(self.peak_limit, self.current)
+
+        self.wake()
+
+    # Мультиплікативне зменшення ліміту. Запит, розпочатий до попереднього зменшення, ліміт не зменшує:
+    # усі запити, які були в польоті на момент зменшення, утворюють одне вікно
+    def backoff(self, request=None):
+        if request is not None and request <= self.window_end:
+            self.skipped_decreases += 1
+            return
+        self.window_end = self.started
+        self.limit = max(self.min_limit, self.limit * self.decrease)
+        self.decreases += 1
+        self.lowest_limit = min(self.lowest_limit, self.current)
+
+        # Після зменшення вважаємо поточну затримку новою нормою, інакше ліміт падав би на кожному запиті
+        if self.latency is not None and self.base_latency is not None:
+            self.latency = self.base_latency
+
+    # Слот для одного запиту: вимірює тривалість і передає результат у release.
+    # is_overload(exception) визначає, чи є помилка ознакою перевантаження сервера
+    @asynccontextmanager
+    async def slot(self, is_overload=None):
+        request = await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            overloaded = bool(is_overload and is_overload(e))
+            self.release(time.monotonic() - started, overloaded=overloaded, failed=not overloaded, request=request)
+            raise
+        except BaseException:
+            self.release(time.monotonic() - started, failed=True, request=request)
+            raise
+        else:
+            self.release(time.monotonic() - started, request=request)
+
+    def summary(self):
+        latency = f"{self.latency * 1000:.0f} мс" if self.latency is not None else "-"
+        base = f"{self.base_latency * 1000:.0f} мс" if self.base_latency is not None else "-"
+        return (
+            f"ліміт {self.current} (мін. {self.min_limit}, макс. {self.max_limit}, пік {self.peak_limit}, найнижчий {self.lowest_limit}), "
+            f"затримка {latency} (базова {base}), зменшень {self.decreases} (пропущено у тому ж вікні {self.skipped_decreases})"
+        )
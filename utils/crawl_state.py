@@ -0,0 +1,130 @@
+import os
+import time
+import sqlite3
+import threading
+
+# Стан обходу сайту в SQLite: які категорії вже пройдені, з якої сторінки продовжувати кожну категорію
+# та які продукти вже поставлені в чергу або оброблені. Дозволяє після збою продовжити з місця зупинки.
+# Стан належить одному запуску: після завершеного запуску (finish) або якщо стан не оновлювався
+# довше max_age секунд, наступний запуск починається з початку
+class CrawlState:
+    def __init__(self, path, max_age=None):
+        self.max_age = max_age
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS categories (
+                url TEXT PRIMARY KEY,
+                page_url TEXT,
+                done INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS products (
+                url TEXT PRIMARY KEY,
+                category TEXT NOT NULL,
+                parent_page_url TEXT,
+                done INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS products_category ON products (category, done)')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        ''')
+
+    def get_meta(self, key):
+        row = self.db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+    # Час останнього оновлення стану (для визначення застарілого стану)
+    def touch(self):
+        self.set_meta('updated_at', time.time())
+
+    # Реєстрація категорій на початку запуску. Повертає ще не пройдені категорії у вихідному порядку.
+    # Якщо попередній запуск завершився, стан застарів або всі категорії вже пройдені, стан очищується для нового
+    def start(self, categories):
+        with self.lock:
+            updated_at = self.get_meta('updated_at')
+            finished = self.get_meta('finished') == '1'
+            expired = self.max_age and updated_at is not None and time.time() - float(updated_at) > self.max_age
+        if finished or expired:
+            self.clear()
+
+        with self.lock:
+            self.set_meta('finished', 0)
+            self.touch()
+            self.db.executemany('INSERT OR IGNORE INTO categories (url) VALUES (?)', [(c,) for c in categories])
+            done = {row[0] for row in self.db.execute('SELECT url FROM categories WHERE done = 1')}
+
+        pending = [category for category in categories if category not in done]
+        if not pending and categories:
+            self.clear()
+            return self.start(categories)
+        return pending
+
+    # Сторінка, з якої потрібно продовжити категорію (None - з першої)
+    def page_url(self, category):
+        with self.lock:
+            row = self.db.execute('SELECT page_url FROM categories WHERE url = ?', (category,)).fetchone()
+        return row[0] if row else None
+
+    def set_page(self, category, page_url):
+        with self.lock:
+            self.db.execute('UPDATE categories SET page_url = ? WHERE url = ?', (page_url, category))
+            self.touch()
+
+    # Продукти категорії, які були поставлені в чергу, але ще не оброблені
+    def queued_products(self, category):
+        with self.lock:
+            return self.db.execute(
+                'SELECT url, parent_page_url FROM products WHERE category = ? AND done = 0', (category,)
+            ).fetchall()
+
+    # Додавання продуктів до черги. Повертає тільки ті URL, яких ще немає у стані
+    def add_products(self, category, parent_page_url, urls):
+        if not urls:
+            return []
+        with self.lock:
+            placeholders = ', '.join('?' for _ in urls)
+            known = {row[0] for row in self.db.execute(f'SELECT url FROM products WHERE url IN ({placeholders})', urls)}
+            new_urls = [url for url in dict.fromkeys(urls) if url not in known]
+            self.db.executemany(
+                'INSERT OR IGNORE INTO products (url, category, parent_page_url) VALUES (?, ?, ?)',
+                [(url, category, parent_page_url) for url in new_urls]
+            )
+        return new_urls
+
+    # Позначення продуктів як оброблених (після того, як їх дані передано обробнику)
+    def mark_done(self, urls):
+        with self.lock:
+            self.db.executemany('UPDATE products SET done = 1 WHERE url = ?', [(url,) for url in urls])
+
+    def finish_category(self, category):
+        with self.lock:
+            self.db.execute('UPDATE categories SET done = 1, page_url = NULL WHERE url = ?', (category,))
+            self.touch()
+
+    # Позначення запуску завершеним (незалежно від результату окремих категорій)
+    def finish(self):
+        with self.lock:
+            self.set_meta('finished', 1)
+
+    def clear(self):
+        with self.lock:
+            self.db.execute('DELETE FROM categories')
+            self.db.execute('DELETE FROM products')
+            self.db.execute('DELETE FROM meta')
+
+    def close(self):
+        with self.lock:
+            self.db.close()
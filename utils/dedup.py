@@ -0,0 +1,177 @@
+import os
+import re
+import struct
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left
+
+# Кількість ID у розрідженому блоці, після якої блок перетворюється на бітову карту (8 КБ)
+ARRAY_LIMIT = 4096
+
+# Функція для отримання ID продукту з URL (/p-<id>)
+def product_id(url):
+    match = re.search(r'/p-(\d+)', url)
+    return int(match.group(1)) if match else None
+
+# Компактна множина цілих ID продуктів. ID розбиваються на блоки за старшими бітами (id >> 16);
+# розріджений блок зберігає відсортований масив 16-бітних молодших частин (2 байти на ID),
+# щільний - бітову карту на 65536 значень. Десятки мільйонів ID займають десятки мегабайт
+class ProductIdSet:
+    def __init__(self):
+        self.chunks = {}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, value):
+        chunk = self.chunks.get(value >> 16)
+        if chunk is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(chunk, bytearray):
+            return bool(chunk[low >> 3] & (1 << (low & 7)))
+        index = bisect_left(chunk, low)
+        return index < len(chunk) and chunk[index] == low
+
+    # Додавання ID. Повертає True, якщо ID раніше не зустрічався
+    def add(self, value):
+        key, low = value >> 16, value & 0xFFFF
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = array('H')
+
+        if isinstance(chunk, bytearray):
+            mask = 1 << (low & 7)
+            if chunk[low >> 3] & mask:
+                return False
+            chunk[low >> 3] |= mask
+        else:
+            index = bisect_left(chunk, low)
+            if index < len(chunk) and chunk[index] == low:
+                return False
+            chunk.insert(index, low)
+            if len(chunk) > ARRAY_LIMIT:
+                self.chunks[key] = self.to_bitmap(chunk)
+
+        self.count += 1
+        return True
+
+    @staticmethod
+    def to_bitmap(chunk):
+        bitmap = bytearray(8192)
+        for low in chunk:
+            bitmap[low >> 3] |= 1 << (low & 7)
+        return bitmap
+
+    # Збереження множини у файл: для кожного блоку - ключ, тип, довжина та дані
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(struct.pack('<Q', self.count))
+            for key, chunk in self.chunks.items():
+                is_bitmap = isinstance(chunk, bytearray)
+                data = bytes(chunk) if is_bitmap else chunk.tobytes()
+                f.write(struct.pack('<QBI', key, is_bitmap, len(data)))
+                f.write(data)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        result = cls()
+        with open(path, 'rb') as f:
+            result.count = struct.unpack('<Q', f.read(8))[0]
+            while True:
+                header = f.read(13)
+                if not header:
+                    break
+                key, is_bitmap, length = struct.unpack('<QBI', header)
+                data = f.read(length)
+                if is_bitmap:
+                    result.chunks[key] = bytearray(data)
+                else:
+                    chunk = array('H')
+                    chunk.frombytes(data)
+                    result.chunks[key] = chunk
+        return result
+
+# Множина вже знайдених продуктів на весь запуск. URL без числового ID зберігаються окремо як рядки
+class SeenProducts:
+    def __init__(self, path=None):
+        self.path = path
+        self.other = set()
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.ids = ProductIdSet.load(path)
+        else:
+            self.ids = ProductIdSet()
+
+    def __len__(self):
+        return len(self.ids) + len(self.other)
+
+    # Додавання продукту за URL. Повертає True, якщо продукт зустрівся вперше
+    def add(self, url):
+        value = product_id(url)
+        with self.lock:
+            if value is None:
+                if url in self.other:
+                    return False
+                self.other.add(url)
+                return True
+            return self.ids.add(value)
+
+    # Збереження множини на диск (якщо вказано шлях)
+    def save(self):
+        if self.path:
+            with self.lock:
+                self.ids.save(self.path)
+
+    # Видалення збереженої множини після завершення обходу
+    def clear(self):
+        self.ids = ProductIdSet()
+        self.other = set()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+# Множина знайдених продуктів, спільна для кількох процесів (шардів обходу), у SQLite.
+# Продукт вважається новим лише для того процесу, чий INSERT додав рядок. Уже відомі ID
+# запам'ятовуються локально, щоб повторні перевірки не зверталися до бази
+class SharedSeenProducts:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.local = ProductIdSet()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS seen (product TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM seen').fetchone()[0]
+
+    # Додавання продукту за URL. Повертає True, якщо продукт зустрівся вперше серед усіх процесів
+    def add(self, url):
+        value = product_id(url)
+        with self.lock:
+            if value is not None and value in self.local:
+                return False
+            cursor = self.db.execute('INSERT OR IGNORE INTO seen (product) VALUES (?)', (str(value) if value is not None else url,))
+            if value is not None:
+                self.local.add(value)
+            return cursor.rowcount == 1
+
+    # Множина вже зберігається в базі; видаляє її запускач після завершення всіх процесів
+    def save(self):
+        pass
+
+    def clear(self):
+        pass
+
+    def close(self):
+        with self.lock:
+            self.db.close()
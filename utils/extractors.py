@@ -0,0 +1,414 @@
+import re
+import configparser
+import soupsieve
+from bs4 import BeautifulSoup
+
+# lxml та cssselect - необов'язкові залежності для швидкого рушія розбору
+try:
+    import lxml.html
+    from lxml import etree
+    from cssselect import GenericTranslator
+except ImportError:
+    lxml = None
+
+# Функції для витягання даних зі сторінок Fruugo. Вони приймають сирий HTML (bytes або str)
+# та повертають звичайні словники, тому їх можна виконувати в окремих процесах
+
+# Завантажуємо конфігурацію
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+# Рушій розбору HTML: lxml (швидкий) або bs4 (BeautifulSoup + html.parser)
+html_engine = config.get('PARSER', 'html_engine', fallback='lxml')
+# Розбір лише потрібних областей сторінок категорій та варіацій замість усього документа
+region_parsing = config.getboolean('PARSER', 'region_parsing', fallback=True)
+if html_engine == 'lxml' and lxml is None:
+    print("⚠️ lxml або cssselect не встановлено, використовується рушій bs4")
+    html_engine = 'bs4'
+
+# Селектори для парсингу
+PRODUCT_LINK_SELECTOR = '.products-list a'
+NEXT_PAGE_SELECTOR = 'a.next-page'
+LAST_PAGE_SELECTOR = '.pagination a:nth-last-child(2)'
+
+TITLE_SELECTOR = ".Product__Details h1.js-product-title"
+PRICE_SELECTOR = ".js-meta-price"
+REGULAR_PRICE_SELECTOR = ".Product__Details .Product__Price del"
+SALE_PRICE_SELECTOR = ".js-meta-price"
+DESCRIPTION_SELECTOR = "#description"
+BRAND_SELECTOR = "ul.product-description-spec-list li:has(strong:-soup-contains('Brand')) span"
+AVAILABILITY_SELECTOR = ".Product__BuyBox strong"
+IMAGES_SELECTOR = "button.js-gallery-thumb"
+IMAGE_SELECTOR = "#main .Product .Product__Top .Product__Gallery .ProductGallery.js-hover-zoom img"
+GALLERY_IMAGE_SELECTOR = ".ProductGallery.js-hover-zoom img"
+CATEGORIES_SELECTOR = ".Product__Top li.breadcrumb-item a"
+VARIATION_SELECTOR = ".custom-select option"
+SIZE_SELECTOR = ".Product__Details .Product__Title label[for='Size'] span"
+COLOR_SELECTOR = ".Product__Details .Product__Title label[for='Colour'] span"
+
+SELECTORS = [
+    PRODUCT_LINK_SELECTOR, NEXT_PAGE_SELECTOR, LAST_PAGE_SELECTOR,
+    TITLE_SELECTOR, PRICE_SELECTOR, REGULAR_PRICE_SELECTOR, SALE_PRICE_SELECTOR,
+    DESCRIPTION_SELECTOR, BRAND_SELECTOR, AVAILABILITY_SELECTOR, IMAGES_SELECTOR,
+    IMAGE_SELECTOR, GALLERY_IMAGE_SELECTOR, CATEGORIES_SELECTOR, VARIATION_SELECTOR, SIZE_SELECTOR, COLOR_SELECTOR,
+]
+
+# XPath для селекторів, які cssselect не підтримує (:has та :-soup-contains є розширеннями soupsieve)
+XPATH_OVERRIDES = {
+    BRAND_SELECTOR: (
+        "descendant-or-self::ul[contains(concat(' ', normalize-space(@class), ' '), ' product-description-spec-list ')]"
+        "/descendant::li[descendant::strong[contains(string(.), 'Brand')]]/descendant::span"
+    ),
+}
+
+# Класи елементів, які містять усі дані сторінки категорії та сторінки варіації
+LISTING_REGIONS = ['products-list', 'pagination', 'next-page']
+VARIATION_REGIONS = ['Product__Details', 'Product__BuyBox', 'ProductGallery', 'js-gallery-thumb']
+
+# Рушій на основі BeautifulSoup: селектори компілюються soupsieve один раз при імпорті
+class SoupDocument:
+    plan = {selector: soupsieve.compile(selector) for selector in SELECTORS}
+
+    def __init__(self, html, restricted=False):
+        self.root = BeautifulSoup(html, 'html.parser')
+        self.restricted = restricted
+
+    # Дерево BeautifulSoup має циклічні посилання (parent/children), тому без decompose
+    # воно звільняється лише збирачем сміття, а не одразу після розбору
+    def close(self):
+        self.root.decompose()
+
+    def select(self, selector):
+        return self.plan[selector].select(self.root)
+
+    def select_one(self, selector):
+        return self.plan[selector].select_one(self.root)
+
+    @staticmethod
+    def text(element):
+        return element.get_text(strip=True)
+
+    @staticmethod
+    def attr(element, name):
+        value = element.get(name)
+        return " ".join(value) if isinstance(value, list) else value
+
+    # На відміну від lxml, BeautifulSoup записує порожні теги як <br/>, <img .../> і сортує атрибути,
+    # тому HTML опису з двох рушіїв однаковий за структурою, але не посимвольно
+    @staticmethod
+    def html(element):
+        return str(element)
+
+# Рушій на основі lxml: селектори перетворюються в XPath і компілюються один раз при імпорті
+class LxmlDocument:
+    if lxml is not None:
+        plan = {
+            selector: etree.XPath(XPATH_OVERRIDES.get(selector) or GenericTranslator().css_to_xpath(selector))
+            for selector in SELECTORS
+        }
+        text_nodes = etree.XPath('descendant::text()')
+
+    def __init__(self, html, restricted=False):
+        if isinstance(html, bytes):
+            html = html.decode('utf-8', errors='replace')
+        try:
+            self.root = lxml.html.document_fromstring(html)
+        except etree.ParserError:
+            # Порожня сторінка
+            self.root = lxml.html.document_fromstring('<html></html>')
+        self.restricted = restricted
+
+    # Дерево lxml звільняється одразу, коли зникає останнє посилання на нього
+    def close(self):
+        self.root = None
+
+    def select(self, selector):
+        return self.plan[selector](self.root)
+
+    def select_one(self, selector):
+        found = self.plan[selector](self.root)
+        return found[0] if found else None
+
+    # Аналог get_text(strip=True) з BeautifulSoup: кожен текстовий вузол обрізається окремо
+    @classmethod
+    def text(cls, element):
+        return "".join(part.strip() for part in cls.text_nodes(element))
+
+    @staticmethod
+    def attr(element, name):
+        return element.get(name)
+
+    @staticmethod
+    def html(element):
+        return lxml.html.tostring(element, encoding='unicode', with_tail=False)
+
+# Функція для розбору HTML обраним рушієм
+def parse_document(html, restricted=False):
+    if html_engine == 'lxml':
+        return LxmlDocument(html, restricted)
+    return SoupDocument(html, restricted)
+
+# Регулярний вираз для перевірки, що тег на початку рядка має клас class_name
+def region_start_pattern(class_name):
+    return re.compile(
+        rb'<([a-zA-Z][a-zA-Z0-9]*)\s[^>]*?\bclass\s*=\s*["\'][^"\']*?(?<![\w-])' + re.escape(class_name.encode()) + rb'(?![\w-])'
+    )
+
+region_patterns = {class_name: region_start_pattern(class_name) for class_name in LISTING_REGIONS + VARIATION_REGIONS}
+
+# Клас без лапок (class=pagination) - такий елемент пошук областей не знайде
+unquoted_class_patterns = {
+    class_name: re.compile(rb'\bclass\s*=\s*' + re.escape(class_name.encode()) + rb'(?![\w-])')
+    for class_name in LISTING_REGIONS + VARIATION_REGIONS
+}
+tag_patterns = {}
+
+# Функція для пошуку початків елементів з класом class_name. Спочатку шукається сама назва класу
+# (швидкий пошук підрядка), потім перевіряється тег, у якому вона знаходиться
+def region_starts(data, class_name):
+    needle = class_name.encode()
+    pattern = region_patterns[class_name]
+    last_start = -1
+    pos = data.find(needle)
+    while pos != -1:
+        start = data.rfind(b'<', 0, pos)
+        if start > last_start:
+            match = pattern.match(data, start)
+            if match:
+                last_start = start
+                yield start, match.group(1).lower()
+        pos = data.find(needle, pos + len(needle))
+
+# Функція для пошуку кінця елемента, який починається з позиції start (з урахуванням вкладених однакових тегів).
+# Повертає позицію після закриваючого тегу або None, якщо розмітка не збалансована
+def region_end(html, start, tag):
+    pattern = tag_patterns.get(tag)
+    if pattern is None:
+        pattern = tag_patterns[tag] = re.compile(rb'<(/?)' + re.escape(tag) + rb'(?=[\s>/])[^>]*>', re.IGNORECASE)
+
+    depth = 0
+    for match in pattern.finditer(html, start):
+        if match.group(1):
+            depth -= 1
+            if depth == 0:
+                return match.end()
+        elif not match.group(0).endswith(b'/>'):
+            depth += 1
+    return None
+
+# Функція для розбору тільки потрібних областей сторінки: елементи з класами regions вирізаються
+# з сирого HTML і розбираються як один маленький документ. Вкладені області не дублюються.
+# Якщо жодної області не знайдено або розмітка не збалансована, розбирається весь документ
+def parse_regions(html, regions):
+    if not region_parsing:
+        return parse_document(html)
+
+    data = html.encode('utf-8') if isinstance(html, str) else html
+    spans = []
+    for class_name in regions:
+        if unquoted_class_patterns[class_name].search(data):
+            return parse_document(html)
+        for start, tag in region_starts(data, class_name):
+            end = region_end(data, start, tag)
+            if end is None:
+                return parse_document(html)
+            spans.append((start, end))
+
+    if not spans:
+        return parse_document(html)
+
+    fragments = []
+    last_end = -1
+    for start, end in sorted(spans):
+        if start >= last_end:
+            fragments.append(data[start:end])
+            last_end = end
+        elif end > last_end:
+            # Області перетинаються без вкладення - розмітка незвична, надійніше розібрати весь документ
+            return parse_document(html)
+
+    return parse_document(b'<html><body>' + b''.join(fragments) + b'</body></html>', restricted=True)
+
+# Функція для отримання повного URL з відносного посилання на сайті
+def absolute_url(url):
+    return "https://www.fruugo.co.uk" + url if url.startswith("/") else url
+
+# Функція для очищення та перетворення тексту ціни у число
+def extract_price(text):
+    if not text:
+        return None
+    cleaned = re.sub(r"[^\d.]", "", text)
+    try:
+        return float(cleaned)
+    except ValueError:
+        return None
+
+# Функція для розбору сторінки категорії (тільки список продуктів та пагінація)
+def extract_listing(html):
+    doc = parse_regions(html, LISTING_REGIONS)
+    try:
+        return listing_data(doc)
+    finally:
+        doc.close()
+
+def listing_data(doc):
+
+    # Знаходимо номер останньої сторінки, якщо він є
+    last_page_element = doc.select_one(LAST_PAGE_SELECTOR)
+    if last_page_element is not None:
+        last_page_number = int(doc.text(last_page_element))
+    else:
+        last_page_number = None
+
+    # Збираємо посилання на продукти на сторінці
+    product_urls = []
+    for product in doc.select(PRODUCT_LINK_SELECTOR):
+        url = doc.attr(product, 'href')
+        if url:
+            product_urls.append(absolute_url(url))
+
+    # Перевірка наявності кнопки "Наступна сторінка"
+    next_page = doc.select_one(NEXT_PAGE_SELECTOR)
+    if next_page is not None and 'disabled' not in (doc.attr(next_page, 'class') or '').split() and doc.attr(next_page, 'href'):
+        next_page_url = absolute_url(doc.attr(next_page, 'href'))
+    else:
+        next_page_url = None
+
+    return {
+        "last_page_number": last_page_number,
+        "product_urls": product_urls,
+        "next_page_url": next_page_url,
+    }
+
+# Функція для розбору основної сторінки продукту.
+# Якщо обов'язкове поле не знайдено, у ключі "error" повертається текст помилки
+def extract_product(html, url):
+    doc = parse_document(html)
+    try:
+        return product_data(doc, url)
+    finally:
+        doc.close()
+
+def product_data(doc, url):
+    warnings = []
+
+    # Отримання заголовку
+    title = doc.select_one(TITLE_SELECTOR)
+    if title is not None:
+        title = doc.text(title)
+    else:
+        return {"error": f"Не вдалося знайти назву продукту на сторінці {url}", "warnings": warnings}
+
+    # Отримання цін
+    regular_price = doc.select_one(REGULAR_PRICE_SELECTOR)
+    if regular_price is not None:
+        regular_price = extract_price(doc.text(regular_price))
+
+        sale_price = doc.select_one(SALE_PRICE_SELECTOR)
+        if sale_price is not None:
+            sale_price = extract_price(doc.text(sale_price))
+        else:
+            sale_price = None
+    else:
+        sale_price = None
+
+        regular_price = doc.select_one(PRICE_SELECTOR)
+        if regular_price is not None:
+            regular_price = extract_price(doc.text(regular_price))
+        else:
+            return {"error": f"Не вдалося знайти ціну продукту на сторінці {url}", "warnings": warnings}
+
+    # Отримання опису
+    description = doc.select_one(DESCRIPTION_SELECTOR)
+    if description is not None:
+        description = doc.html(description)
+    else:
+        return {"error": f"Не вдалося знайти опис продукту на сторінці {url}", "warnings": warnings}
+
+    # Отримання категорії
+    categories = doc.select(CATEGORIES_SELECTOR)
+    if categories:
+        categories = " > ".join([doc.text(cat) for cat in categories])
+    else:
+        warnings.append(f"Не вдалося знайти категорії продукту на сторінці {url}")
+        categories = None
+
+    # Отримання бренду
+    brand = doc.select_one(BRAND_SELECTOR)
+    if brand is not None:
+        brand = doc.text(brand)
+    else:
+        brand = None
+
+    # Отримання id варіацій без повторів
+    variation_ids = []
+    for variation_option in doc.select(VARIATION_SELECTOR):
+        value = doc.attr(variation_option, 'value') or ''
+
+        match = re.search(r'\[([^\]]+)\]', value)
+        if not match:
+            continue
+
+        for id in match.group(1).split(', '):
+            if id not in variation_ids:
+                variation_ids.append(id)
+
+    return {
+        "error": None,
+        "warnings": warnings,
+        "title": title,
+        "regular_price": regular_price,
+        "sale_price": sale_price,
+        "description": description,
+        "categories": categories,
+        "brand": brand,
+        "variation_ids": variation_ids,
+    }
+
+# Функція для розбору сторінки варіації (тільки деталі, наявність та галерея)
+def extract_variation(html):
+    doc = parse_regions(html, VARIATION_REGIONS)
+    try:
+        return variation_data(doc)
+    finally:
+        doc.close()
+
+def variation_data(doc):
+
+    # Отримання розміру
+    size = doc.select_one(SIZE_SELECTOR)
+    if size is not None:
+        size = doc.text(size)
+
+    # Отримання кольору
+    color = doc.select_one(COLOR_SELECTOR)
+    if color is not None:
+        color = doc.text(color)
+
+    # Костиль для обміну розміру та кольору - на сайті коли вони обидва присутні, то розмір і колір переплутані
+    if color and size:
+        size, color = color, size
+
+    # Отримання наявності
+    availability = doc.select_one(AVAILABILITY_SELECTOR)
+    if availability is not None:
+        availability = doc.text(availability) == "In stock"
+
+    # Отримання зображень
+    images = doc.select(IMAGES_SELECTOR)
+    if images:
+        images = [doc.attr(img, 'data-image') for img in images]
+    else:
+        # В обмеженому документі немає предків галереї, тому використовується коротший селектор
+        image = doc.select_one(GALLERY_IMAGE_SELECTOR if doc.restricted else IMAGE_SELECTOR)
+        if image is not None:
+            images = [doc.attr(image, 'src')]
+        else:
+            images = []
+
+    return {
+        "size": size,
+        "color": color,
+        "availability": availability,
+        "images": images
+    }
@@ -0,0 +1,67 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import threading
+
+# Функція для обчислення відбитка продукту за даними основної сторінки (без сторінок варіацій)
+def product_fingerprint(page):
+    payload = json.dumps([
+        page["title"],
+        page["regular_price"],
+        page["sale_price"],
+        page["description"],
+        page["categories"],
+        page["brand"],
+        sorted(page["variation_ids"]),
+    ], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+# Ключ продукту - його ID з URL (/p-<id>), щоб зміна slug у посиланні не вважалась новим продуктом
+def product_key(url):
+    match = re.search(r'/p-(\d+)', url)
+    return match.group(1) if match else url
+
+# Відбитки продуктів з попередніх запусків у SQLite. Використовується для інкрементального оновлення:
+# якщо відбиток не змінився, варіації не завантажуються і продукт не передається обробнику
+class FingerprintStore:
+    def __init__(self, path):
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Файл відбитків спільний для шардів парсера та імпортера, тому запис чекає на блокування до 60 секунд
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                product_id TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL
+            )
+        ''')
+
+    # Перевірка, чи продукт не змінився з попереднього запуску
+    def unchanged(self, url, fingerprint):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT fingerprint FROM fingerprints WHERE product_id = ?', (product_key(url),)
+            ).fetchone()
+        return row is not None and row[0] == fingerprint
+
+    # Збереження відбитків продуктів, які були передані обробнику
+    def save(self, products):
+        with self.lock:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO fingerprints (product_id, fingerprint) VALUES (?, ?)',
+                [(product_key(product["url"]), product["fingerprint"]) for product in products]
+            )
+
+    # Видалення відбитків продуктів, щоб наступний інкрементальний запуск зібрав їх повторно
+    def forget(self, urls):
+        with self.lock:
+            self.db.executemany('DELETE FROM fingerprints WHERE product_id = ?', [(product_key(url),) for url in urls])
+
+    def close(self):
+        with self.lock:
+            self.db.close()
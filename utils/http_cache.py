@@ -0,0 +1,119 @@
+import os
+import time
+import zlib
+import sqlite3
+import threading
+
+# Запис з кешу відповідей
+class CachedResponse:
+    def __init__(self, body, etag, last_modified, fresh):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh = fresh
+
+    # Заголовки для умовного запиту (сервер відповість 304, якщо сторінка не змінилась)
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+# Дисковий кеш HTTP-відповідей у SQLite. Тіло зберігається стиснутим zlib разом з ETag та Last-Modified.
+# Протягом ttl секунд відповідь віддається без запиту, після цього - перевіряється умовним запитом.
+# Якщо загальний розмір перевищує max_bytes, видаляються записи, які найдовше не використовувались.
+# Файл кешу може використовуватись кількома процесами (шардами) одночасно, тому запис чекає на блокування до 60 секунд
+class ResponseCache:
+    def __init__(self, path, ttl, max_bytes):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+        self.total_size = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    # Отримання відповіді з кешу. Застарілі записи без ETag/Last-Modified не можна перевірити, тому вони видаляються
+    def get(self, url):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                'SELECT body, etag, last_modified, stored_at, size FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            body, etag, last_modified, stored_at, size = row
+            fresh = now - stored_at < self.ttl
+            if not fresh and not etag and not last_modified:
+                self.db.execute('DELETE FROM responses WHERE url = ?', (url,))
+                self.total_size -= size
+                return None
+
+            self.db.execute('UPDATE responses SET accessed_at = ? WHERE url = ?', (now, url))
+
+        return CachedResponse(zlib.decompress(body), etag, last_modified, fresh)
+
+    # Збереження відповіді в кеш
+    def store(self, url, body, headers):
+        compressed = zlib.compress(body)
+        now = time.time()
+        with self.lock:
+            row = self.db.execute('SELECT size FROM responses WHERE url = ?', (url,)).fetchone()
+            if row:
+                self.total_size -= row[0]
+
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses (url, body, etag, last_modified, stored_at, accessed_at, size) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, compressed, headers.get('ETag'), headers.get('Last-Modified'), now, now, len(compressed))
+            )
+            self.total_size += len(compressed)
+
+            if self.total_size > self.max_bytes:
+                self.evict()
+
+    # Сторінка не змінилась (304): продовжуємо термін свіжості запису
+    def refresh(self, url):
+        with self.lock:
+            self.db.execute('UPDATE responses SET stored_at = ? WHERE url = ?', (time.time(), url))
+
+    # Видалення записів, які найдовше не використовувались, поки розмір не опуститься до 90% ліміту.
+    # Записи видаляються короткими транзакціями по 100, щоб інші процеси не чекали на весь процес очищення.
+    # Розмір перечитується з файлу, бо інші процеси теж додають і видаляють записи
+    def evict(self):
+        target = self.max_bytes * 0.9
+        while True:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                self.total_size = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+                if self.total_size <= target:
+                    break
+                rows = self.db.execute('SELECT url, size FROM responses ORDER BY accessed_at LIMIT 100').fetchall()
+                for url, size in rows:
+                    self.db.execute('DELETE FROM responses WHERE url = ?', (url,))
+                    self.total_size -= size
+                    if self.total_size <= target:
+                        break
+            finally:
+                self.db.execute('COMMIT')
+
+    def close(self):
+        with self.lock:
+            self.db.close()
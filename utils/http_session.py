@@ -0,0 +1,21 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Сесії requests окремі для кожного потоку (requests.Session не гарантує безпеку між потоками).
+# Сесія тримає відкриті з'єднання з хостами, тому TCP та TLS не встановлюються для кожного запиту заново.
+# Спільна для синхронного парсера та імпортера
+thread_local = threading.local()
+
+# Функція для отримання сесії поточного потоку
+def get_session():
+    session = getattr(thread_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        # Потік виконує один запит одночасно, тому на хост достатньо кількох з'єднань;
+        # pool_connections - кількість хостів (сайт, CDN, магазин), з'єднання до яких зберігаються
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=2)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        thread_local.session = session
+    return session
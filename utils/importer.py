@@ -1,18 +1,30 @@
 import os
+import re
+import glob
 import json
 import time
+import hashlib
 from tqdm import tqdm
 import threading
 from pathlib import Path
+from contextlib import nullcontext
 from queue import Queue
 from dotenv import load_dotenv
 import threading
-import requests
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse
-from io import BytesIO
 import configparser
 import webcolors
 from rapidfuzz import process
+from utils.ndjson import read_batches
+from utils.retry import RetryPolicy, ResponseError, call_with_retries
+from utils.metrics import metrics
+from utils.http_session import get_session
+from utils.fingerprints import FingerprintStore
+from utils.term_index import TermIndex, normalize_name
+from utils.category_index import CategoryIndex, split_breadcrumb
+from utils.media_registry import MediaRegistry
 
 # Отримуємо налаштування з конфігурації
 config = configparser.ConfigParser()
@@ -21,6 +33,18 @@ config.read('config.ini')
 download_images_before_import = config.getboolean('IMPORTER', 'download_images_before_import', fallback=True)
 requests_delay = config.getint('IMPORTER', 'requests_delay', fallback=1)
 default_swatches_size = config.getint('IMPORTER', 'default_swatches_size', fallback=32)
+batch_size = config.getint('IMPORTER', 'batch_size', fallback=100)
+max_retries = config.getint('IMPORTER', 'max_retries', fallback=3)
+retry_max_delay = config.getfloat('IMPORTER', 'retry_max_delay', fallback=60)
+retry_budget = config.getint('IMPORTER', 'retry_budget', fallback=10)
+retry_budget_refill = config.getfloat('IMPORTER', 'retry_budget_refill', fallback=0.5)
+retry_max_throttle_wait = config.getfloat('IMPORTER', 'retry_max_throttle_wait', fallback=600)
+persist_terms = config.getboolean('IMPORTER', 'persist_terms', fallback=True)
+persist_categories = config.getboolean('IMPORTER', 'persist_categories', fallback=True)
+image_download_workers = config.getint('IMPORTER', 'image_download_workers', fallback=8)
+image_upload_workers = config.getint('IMPORTER', 'image_upload_workers', fallback=4)
+use_media_registry = config.getboolean('IMPORTER', 'media_registry', fallback=True)
+verify_media = config.getboolean('IMPORTER', 'verify_media', fallback=False)
 
 # Завантажуємо .env
 load_dotenv()
@@ -44,29 +68,60 @@ HEADERS = {
     "Accept-Language": "en-US,en;q=0.5",
 }
 
-# Функція для виконання HTTP запитів з повторними спробами
-def make_request(method, url, **kwargs):
-    for attempt in range(3):
-        if attempt > 0:
-            print(f"🔁 Повторна спроба {attempt+1} для {method.upper()} {url}")
-        time.sleep(requests_delay)
-        try:
-            response = requests.request(method, url, **kwargs)
-
-            if "Fatal error" in response.text:
-                print(f"❌ WC Fatal error: {response.text[:200]}...")
-                continue
+# Політика повторних запитів (експоненційна затримка від requests_delay, Retry-After, бюджет повторів)
+retry_policy = RetryPolicy(max_retries, base_delay=requests_delay, max_delay=retry_max_delay, budget=retry_budget,
+                           refill_rate=retry_budget_refill, max_throttle_wait=retry_max_throttle_wait)
 
-            if response.status_code in [200, 201]:
-                return response
+# Окремі ліміти одночасних запитів до CDN із зображеннями та до медіатеки WordPress
+cdn_slots = threading.BoundedSemaphore(image_download_workers)
+media_slots = threading.BoundedSemaphore(image_upload_workers)
 
-            print(f"❌ Спроба {attempt+1}: {response.status_code} {response.text[:200]}...")
+# Функція для отримання мітки ендпоінта для метрик: шлях WooCommerce API без ID або хост для зовнішніх URL
+def endpoint_label(url):
+    if WC_URL and url.startswith(WC_URL):
+        return re.sub(r'/\d+(?=/|$)', '/{id}', urlparse(url).path)
+    return urlparse(url).netloc
 
-        except Exception as e:
-            print(f"❌ Виняток при запиті (спроба {attempt+1}): {e}")
+# Функція для виконання одного HTTP запиту із записом кількості, статусу та тривалості в метрики
+def api_request(method, url, **kwargs):
+    endpoint = endpoint_label(url)
+    started = time.monotonic()
+    try:
+        response = get_session().request(method, url, **kwargs)
+    except Exception:
+        metrics.record_request('importer', 'error', time.monotonic() - started, method=method.upper(), endpoint=endpoint)
+        raise
+    # Тіло потокової відповіді (stream=True) читає викликач, тому його розмір тут не рахується
+    size = 0 if kwargs.get('stream') else len(response.content)
+    metrics.record_request('importer', response.status_code, time.monotonic() - started, size, method=method.upper(), endpoint=endpoint)
+    return response
+
+# Функція для створення on_failure імпортера: повідомлення про кожну невдалу спробу запиту
+def report_failure(description):
+    def on_failure(exception, attempt, throttled, delay):
+        if throttled:
+            print(f"⏳ Сервер просить зачекати {delay:.1f} с: {description}")
+        else:
+            print(f"❌ Спроба {attempt+1} для {description}: {exception}")
+    return on_failure
+
+# Функція для виконання HTTP запитів з повторними спробами.
+# Повторюються тільки тимчасові помилки (мережа, 429, 5xx, WC Fatal error); 4xx повертає None одразу,
+# крім статусів з expected, які повертаються викликачу
+def make_request(method, url, expected=(200, 201), **kwargs):
+    def request():
+        response = api_request(method, url, **kwargs)
+        if "Fatal error" in response.text:
+            raise ResponseError(500, message=f"WC Fatal error: {response.text[:200]}...")
+        if response.status_code not in expected:
+            raise ResponseError(response.status_code, response.headers, f"{response.status_code} {response.text[:200]}...")
+        return response
 
-    print(f"❌ Не вдалося виконати {method.upper()} {url} після 3 спроб")
-    return None
+    try:
+        return call_with_retries(retry_policy, request, report_failure(f"{method.upper()} {url}"))
+    except Exception:
+        print(f"❌ Не вдалося виконати {method.upper()} {url}")
+        return None
 
 # Отримання ID атрибуту за slug
 def get_attribute_id_by_slug(slug):
@@ -87,10 +142,154 @@ def get_attribute_id_by_slug(slug):
 color_id = get_attribute_id_by_slug("pa_color")
 size_id = get_attribute_id_by_slug("pa_size")
 
+# Максимальна кількість елементів в одному batch-запиті WooCommerce
+TERMS_BATCH_LIMIT = 100
+
+# Індекс термінів атрибутів (назва -> ID), спільний для всіх батчів процесу
+term_index = TermIndex('data/wc_terms.json' if persist_terms else None, WC_URL)
+
+# Функція для завантаження всіх термінів атрибуту в індекс (один раз на процес).
+# Збережений індекс використовується, якщо кількість термінів та ID найновішого не змінились
+def load_attribute_terms(attr_id):
+    if term_index.loaded(attr_id):
+        return
+
+    url = f"{WC_URL}/wp-json/wc/v3/products/attributes/{attr_id}/terms"
+    if term_index.cached(attr_id):
+        r = make_request("GET", url, auth=(WC_KEY, WC_SECRET), params={"per_page": 1, "orderby": "id", "order": "desc"})
+        if r is not None and "X-WP-Total" in r.headers:
+            data = r.json()
+            if term_index.revalidate(attr_id, int(r.headers["X-WP-Total"]), data[0]["id"] if data else 0):
+                return
+
+    terms = []
+    page = 1
+    while True:
+        r = make_request("GET", url, auth=(WC_KEY, WC_SECRET), params={"per_page": 100, "page": page})
+        if r is None:
+            raise RuntimeError(f"Не вдалося завантажити терміни атрибуту {attr_id}")
+
+        data = r.json()
+        terms.extend((t["id"], t["name"]) for t in data)
+        if len(data) < 100:
+            break
+        page += 1
+
+    term_index.replace(attr_id, terms)
+    term_index.save()
+    print(f"✅ Завантажено термінів атрибуту {attr_id}: {len(terms)}")
+
+# Функція для створення терміну атрибуту. Повертає ID (також якщо термін уже існує) або None
+def create_term(attr_id, name):
+    r = api_request(
+        "POST",
+        f"{WC_URL}/wp-json/wc/v3/products/attributes/{attr_id}/terms",
+        auth=(WC_KEY, WC_SECRET),
+        json={"name": name}
+    )
+    if r.status_code == 201:
+        term_id = r.json().get("id")
+    else:
+        data = r.json() if r.headers.get("Content-Type", "").startswith("application/json") else {}
+        if data.get("code") != "term_exists":
+            print(f"⚠️ Не вдалося створити термін '{name}': {r.status_code} - {r.text}")
+            return None
+        term_id = data["data"]["resource_id"]
+
+    term_index.add(attr_id, name, term_id)
+    return term_id
+
+# Функція для створення відсутніх термінів атрибуту пакетами через terms/batch (до 100 за запит).
+# Повертає словник назва -> ID для термінів, які були створені (не знайдені через term_exists)
+def create_terms(attr_id, names):
+    created = {}
+    for start in range(0, len(names), TERMS_BATCH_LIMIT):
+        chunk = names[start:start + TERMS_BATCH_LIMIT]
+        r = make_request(
+            "POST",
+            f"{WC_URL}/wp-json/wc/v3/products/attributes/{attr_id}/terms/batch",
+            auth=(WC_KEY, WC_SECRET),
+            json={"create": [{"name": name} for name in chunk]}
+        )
+        if r is None:
+            print(f"⚠️ Не вдалося створити терміни атрибуту {attr_id} пакетом: {len(chunk)} шт.")
+            continue
+
+        # Відповіді йдуть у порядку запиту; термін, який уже існує, повертається з помилкою term_exists та його ID
+        for name, item in zip(chunk, r.json().get("create", [])):
+            error = item.get("error")
+            if not error:
+                term_index.add(attr_id, name, item["id"])
+                created[name] = item["id"]
+            elif error.get("code") == "term_exists":
+                term_index.add(attr_id, name, error["data"]["resource_id"])
+            else:
+                print(f"⚠️ Не вдалося створити термін '{name}': {error.get('message', error)}")
+    return created
+
+# Функція для підготовки термінів для всього батчу: всі відсутні розміри та кольори
+# створюються до обробки продуктів, щоб далі терміни лише шукались в індексі
+def prepare_batch_terms(products):
+    for attr_id, key in ((size_id, "size"), (color_id, "color")):
+        load_attribute_terms(attr_id)
+
+        missing = {}
+        for p in products:
+            for v in p["variations"]:
+                name = v.get(key)
+                if name and not term_index.get(attr_id, name):
+                    missing.setdefault(normalize_name(name), name)
+        if not missing:
+            continue
+
+        created = create_terms(attr_id, list(missing.values()))
+        print(f"✅ Створено термінів атрибуту {key}: {len(created)} з {len(missing)}")
+        if attr_id == color_id:
+            for name, term_id in created.items():
+                set_color_meta(term_id, name)
+
+# Функція для встановлення HEX-коду кольору для терміну кольору
+def set_color_meta(term_id, name):
+    try:
+        hex_code = webcolors.name_to_hex(name)
+    except ValueError:
+        hex_code = None
+
+    if hex_code:
+        api_request(
+            "POST",
+            f"{WC_URL}/wp-json/custom/v1/set-color-meta/",
+            json={"term_id": term_id, "hex": hex_code}
+        )
+    else:
+        print(f"⚠️ Не вдалося визначити HEX для '{name}'")
+
+# Файл відбитків продуктів інкрементального режиму парсера
+FINGERPRINTS_PATH = 'data/fingerprints.sqlite'
+
+# Функція для видалення відбитків продуктів, які не вдалося імпортувати. Парсер в інкрементальному режимі
+# зберігає відбиток, коли продукт записано в батч, тому без цього невдало імпортований продукт
+# пропускався б усіма наступними запусками. Якщо файлу відбитків немає, інкрементальний режим не використовується
+def forget_fingerprints(products):
+    urls = [p["url"] for p in products if p.get("url")]
+    if not urls or not os.path.exists(FINGERPRINTS_PATH):
+        return
+
+    store = FingerprintStore(FINGERPRINTS_PATH)
+    try:
+        store.forget(urls)
+    finally:
+        store.close()
+    print(f"⚠️ Відбитки продуктів видалено: {len(urls)}, наступний запуск парсера збере їх повторно")
+
+# Розширення файлів батчів, які пише NdjsonWriter парсерів
+NDJSON_SUFFIXES = ('.ndjson', '.ndjson.gz', '.ndjson.zst')
+
 # Функція для додавання батчу в чергу
 def add_batch_to_queue(batch_path: str):
     global is_processing
     if Path(batch_path).is_file():
+        metrics.start()
         batch_queue.put(batch_path)
         
         with processing_lock:
@@ -103,20 +302,38 @@ def add_batch_to_queue(batch_path: str):
 # Обробка одного батчу
 def process_batch():
     global is_processing
-    while not batch_queue.empty():
+    while True:
+        # Перевірка черги та скидання прапорця під тим самим локом, що й у add_batch_to_queue: інакше батч,
+        # доданий між перевіркою та скиданням, залишився б у черзі без потоку обробки
+        with processing_lock:
+            if batch_queue.empty():
+                is_processing = False
+                break
         batch_path = batch_queue.get()
         try:
-            with open(batch_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                try:
-                    import_batch(data)
-                except Exception as e:
-                    print(f"❌ Помилка при обробці {batch_path}: {e}")
+            # NDJSON-файли читаються потоково частинами по batch_size продуктів
+            if batch_path.endswith(NDJSON_SUFFIXES):
+                for data in read_batches(batch_path, batch_size):
+                    try:
+                        with metrics.timer('import_batch_seconds', client='importer'):
+                            import_batch(data)
+                    except Exception as e:
+                        print(f"❌ Помилка при обробці {batch_path}: {e}")
+                        forget_fingerprints(data)
+            else:
+                with open(batch_path, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+                    try:
+                        with metrics.timer('import_batch_seconds', client='importer'):
+                            import_batch(data)
+                    except Exception as e:
+                        print(f"❌ Помилка при обробці {batch_path}: {e}")
+                        forget_fingerprints(data)
         except Exception as e:
             print(f"❌ Помилка при обробці {batch_path}: {e}")
         finally:
             batch_queue.task_done()
-    is_processing = False
+    metrics.flush()
 
 # Функція для імпорту батчу
 def import_batch(products):
@@ -125,7 +342,13 @@ def import_batch(products):
     }
 
     all_img_urls = {}
-    last_categories = {}
+
+    # Відсутні терміни всього батчу створюються пакетно до обробки продуктів
+    prepare_batch_terms(products)
+
+    # Зображення всього батчу завантажуються в медіатеку паралельно до обробки продуктів
+    if download_images_before_import:
+        uploaded_images = upload_images([img for p in products for img in p["images"]])
     
     # Формуємо дані для створення товарів
     for p in tqdm(products, desc="Імпорт батчу товарів", unit="т."):
@@ -133,58 +356,19 @@ def import_batch(products):
         attributes = []
         img_urls = {}
 
-        # Перевірка наявності атрибутів кольору та розміру
+        # Пошук термінів кольору та розміру в індексі. Терміни, які не вдалося створити пакетом, створюються по одному
         def ensure_terms_exist(attr_id, terms):
-            page = 1
-
-            existing_names = {}
-
-            while True:
-                r = requests.get(
-                    f"{WC_URL}/wp-json/wc/v3/products/attributes/{attr_id}/terms",
-                    auth=(WC_KEY, WC_SECRET),
-                    params={"per_page": 100, "page": page}
-                )
-
-                data = r.json()
-                if not data:
-                    break
-
-                existing_names.update({t['name']: t['id'] for t in data})
-
-                if len(data) < 100:
-                    break
-
-                page += 1
-
             terms_ids = {}
-
             for term in terms:
-                term_id = existing_names.get(term)
+                term_id = term_index.get(attr_id, term)
+                if not term_id:
+                    term_id = create_term(attr_id, term)
+                    if attr_id == color_id and term_id:
+                        set_color_meta(term_id, term)
+
                 if term_id:
                     terms_ids[term] = term_id
 
-                if not term_id:
-                    r = requests.post(
-                        f"{WC_URL}/wp-json/wc/v3/products/attributes/{attr_id}/terms",
-                        auth=(WC_KEY, WC_SECRET),
-                        json={"name": term}
-                    )
-                    if r.status_code != 201:
-                        print(f"⚠️ Не вдалося створити термін '{term}': {r.status_code} - {r.text}")
-                        continue
-                    term_id = r.json().get("id")
-
-                if attr_id == color_id and term_id:
-                    hex_code = webcolors.name_to_hex(term)
-                    if hex_code:
-                        r = requests.post(
-                            f"https://shop1.sweetcare.christmas/wp-json/custom/v1/set-color-meta/",
-                            json={"term_id": term_id, "hex": hex_code}
-                        )
-                    else:
-                        print(f"⚠️ Не вдалося визначити HEX для '{term}'")
-
             return terms_ids
 
         # Обробка розмірів
@@ -211,12 +395,9 @@ def import_batch(products):
                 "options": colors
             })
         
-        # Завантаження зображень
+        # Зображення продукту (завантажені в медіатеку до обробки продуктів)
         if download_images_before_import:
-            for img_url in tqdm(p["images"], desc="Завантаження зображень", leave=False):
-                uploaded = upload_image_to_wc(img_url)
-                if uploaded:
-                    img_urls[img_url] = uploaded
+            img_urls = {img: uploaded_images[img] for img in p["images"] if img in uploaded_images}
         else:
             img_urls = {img: img for img in p["images"]}
 
@@ -224,19 +405,8 @@ def import_batch(products):
         for img_url, img_id in img_urls.items():
             all_img_urls[img_url] = img_id
 
-        # Отримання категорії
-        if p["categories"] in last_categories:
-            category_id = last_categories[p["categories"]]
-            print(f"🔄 Використання останньої категорії: {p['categories']} (ID: {category_id})")
-        else:
-            category_id = get_or_create_category_chain(p["categories"])
-
-        # Зберігаємо останні категорії щоб зменшити кількість запитів
-        last_categories[p["categories"]] = category_id
-
-        # Обмежуємо кількість збережених останніх категорій до 2
-        if len(last_categories) > 2:
-            last_categories = {k: last_categories[k] for k in list(last_categories.keys())[-2:]}
+        # Отримання категорії (з індексу категорій, відсутні рівні створюються)
+        category_id = get_or_create_category_chain(p["categories"])
 
         swatches = {}
         for var in p["variations"]:
@@ -285,6 +455,10 @@ def import_batch(products):
                 "attributes": attributes,
             })
 
+    # Зберігаємо індекси термінів та категорій разом зі створеними в цьому батчі
+    term_index.save()
+    category_index.save()
+
     # Створення товарів у WooCommerce
     product_res = make_request(
         "POST",
@@ -294,13 +468,16 @@ def import_batch(products):
     )
 
     # Перевірка статусу відповіді
-    if product_res.status_code not in [200, 201]:
-        print(f"❌ Помилка при створенні товарів: {product_res.status_code} {product_res.text}")
+    if product_res is None:
+        print("❌ Помилка при створенні товарів: запит не вдався")
+        forget_fingerprints(products)
         return
 
-    # Отримання створених товарів
+    # Отримання створених товарів (товари з помилкою повертаються з id 0 та ключем error)
     created = product_res.json().get("create", [])
+    forget_fingerprints([p for product_obj, p in zip(created, products) if product_obj.get("error") or not product_obj.get("id")] + products[len(created):])
     print(f"✅ Створено товарів: {len(created)}")
+    metrics.inc('products_total', len(created), client='importer')
 
     # Імпорт варіацій для кожного створеного товару
     for product_obj, p in tqdm(zip(created, products), total=len(created), desc="Імпорт варіацій батчу", unit="в."):
@@ -334,130 +511,249 @@ def import_batch(products):
             json={"create": variations}
         )
 
-        if var_res.status_code not in [200, 201]:
-            print(f"❌ Варіації для продукту ID {product_obj.get('id', 'невідомо')} не додано: {var_res.status_code}")
+        if var_res is None:
+            print(f"❌ Варіації для продукту ID {product_obj.get('id', 'невідомо')} не додано")
+            forget_fingerprints([p])
         else:
             print(f"  ↳ ✅ Варіацій додано: {len(variations)} для продукту ID {product_id}")
 
-# Функція для завантаження зображення до WooCommerce
-def upload_image_to_wc(image_url, retries=3):
-    try:
-        response = make_request("GET", image_url, headers=HEADERS)
-        if not response or response.status_code != 200:
-            print(f"❌ Помилка завантаження картинки: {image_url}")
+# Функція для паралельного завантаження зображень у медіатеку WordPress.
+# Завантаження з CDN та відправка в WordPress перекриваються між потоками. Повертає словник URL -> ID медіа
+def upload_images(image_urls):
+    image_urls = list(dict.fromkeys(image_urls))
+    uploaded = {}
+    if not image_urls:
+        return uploaded
+
+    workers = min(len(image_urls), image_download_workers + image_upload_workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(upload_image_to_wc, image_url): image_url for image_url in image_urls}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Завантаження зображень", leave=False):
+            image_id = future.result()
+            if image_id:
+                uploaded[futures[future]] = image_id
+    return uploaded
+
+# Реєстр завантажених зображень (URL та хеш вмісту -> ID медіа) між запусками (None - реєстр вимкнено)
+if use_media_registry:
+    media_registry = MediaRegistry('data/media_registry.sqlite', WC_URL)
+else:
+    media_registry = None
+
+# ID медіа, перевірені в цьому процесі (режим verify_media)
+verified_media = set()
+verified_lock = threading.Lock()
+
+# Функція для перевірки, що медіа з реєстру ще існує в медіатеці. Застарілий ID видаляється з реєстру.
+# Без verify_media ID з реєстру вважаються дійсними
+def media_is_valid(media_id):
+    if not verify_media:
+        return True
+    with verified_lock:
+        if media_id in verified_media:
+            return True
+
+    with media_slots:
+        res = make_request(
+            "GET",
+            f"{WC_URL}/wp-json/wp/v2/media/{media_id}",
+            expected=(200, 404, 410),
+            auth=(WC_USERNAME, WC_PASSWORD),
+            params={"_fields": "id"}
+        )
+    # Якщо перевірити не вдалося, ID не видаляється
+    if res is not None and res.status_code in [404, 410]:
+        print(f"⚠️ Медіа ID {media_id} більше не існує, зображення буде завантажено повторно")
+        media_registry.forget(media_id)
+        return False
+
+    with verified_lock:
+        verified_media.add(media_id)
+    return True
+
+# Функція для завантаження зображення з CDN у тимчасовий файл (потоково, без копії в пам'яті).
+# Повертає (файл, Content-Type, SHA-256 вмісту) або None
+def download_image(image_url):
+    def request():
+        file = tempfile.TemporaryFile()
+        try:
+            with cdn_slots:
+                with api_request("GET", image_url, headers=HEADERS, stream=True, timeout=60) as response:
+                    if response.status_code != 200:
+                        raise ResponseError(response.status_code, response.headers)
+
+                    size = 0
+                    digest = hashlib.sha256()
+                    for chunk in response.iter_content(64 * 1024):
+                        file.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                    metrics.inc('http_response_bytes_total', size, client='importer', endpoint=endpoint_label(image_url))
+                    content_type = response.headers.get('Content-Type', 'image/jpeg').split(';')[0]
+        except BaseException:
+            file.close()
+            raise
+
+        if size < 100:
+            print(f"❌ Порожній або надто малий файл: {image_url}")
+            file.close()
             return None
 
-        content = response.content
+        file.seek(0)
+        return file, content_type, digest.hexdigest()
 
-        if not content or len(content) < 100:
-            print(f"❌ Порожній або надто малий файл: {image_url}")
+    try:
+        return call_with_retries(retry_policy, request, report_failure(f"GET {image_url}"))
+    except Exception:
+        print(f"❌ Помилка завантаження картинки: {image_url}")
+        return None
+
+# Функція для завантаження зображення до WooCommerce. Файл відправляється тілом запиту
+# безпосередньо з диска; при повторі файл лише перемотується на початок.
+# Реєстр медіа перевіряється за URL до завантаження з CDN і за хешем вмісту перед відправкою
+def upload_image_to_wc(image_url):
+    try:
+        if media_registry is not None:
+            media_id = media_registry.by_url(image_url)
+            if media_id and media_is_valid(media_id):
+                return media_id
+
+        downloaded = download_image(image_url)
+        if downloaded is None:
             return None
 
-        filename = Path(urlparse(image_url).path).name
+        file, content_type, digest = downloaded
+        with file, (media_registry.hash_lock(digest) if media_registry is not None else nullcontext()):
+            if media_registry is not None:
+                media_id = media_registry.by_hash(digest)
+                if media_id and media_is_valid(media_id):
+                    media_registry.save(image_url, digest, media_id)
+                    return media_id
 
-        for attempt in range(retries):
-            file_stream = BytesIO(content)
+            filename = Path(urlparse(image_url).path).name
             headers = {
-                'Content-Disposition': f'attachment; filename="{filename}"'
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'Content-Type': content_type,
             }
 
-            res = requests.post(
-                f"{WC_URL}/wp-json/wp/v2/media",
-                auth=(WC_USERNAME, WC_PASSWORD),
-                headers=headers,
-                files={'file': (filename, file_stream, 'image/jpeg')}
-            )
-
-            if res and res.status_code in [200, 201]:
-                try:
-                    return res.json()["id"]
-                except json.JSONDecodeError:
-                    print(f"❌ Не вдалося розпарсити JSON відповідь: {res.text}.\n🔁 Повторна спроба...")
-            else:
-                print(f"❌ WC не прийняв картинку (спроба {attempt+1}): {res.status_code if res else '❌'} {res.text[:200] if res else ''}")
-                time.sleep(requests_delay)
+            def request():
+                file.seek(0)
+                with media_slots:
+                    res = api_request(
+                        "POST",
+                        f"{WC_URL}/wp-json/wp/v2/media",
+                        auth=(WC_USERNAME, WC_PASSWORD),
+                        headers=headers,
+                        data=file
+                    )
+                if res.status_code not in [200, 201]:
+                    raise ResponseError(res.status_code, res.headers, f"WC не прийняв картинку: {res.status_code} {res.text[:200]}")
+                # Некоректна JSON-відповідь повторюється так само, як помилка з'єднання
+                return res.json()["id"]
 
-        print(f"❌ Вичерпано спроб завантаження зображення для {image_url}")
-        return None
+            try:
+                image_id = call_with_retries(retry_policy, request, report_failure(f"POST {filename}"))
+            except Exception:
+                print(f"❌ Вичерпано спроб завантаження зображення для {image_url}")
+                return None
+
+            if media_registry is not None:
+                media_registry.save(image_url, digest, image_id)
+            return image_id
 
     except Exception as e:
         print(f"❌ Виняток при завантаженні зображення: {e}")
         return None
 
-# Функція для отримання або створення категорії з ланцюжком (breadcrumb)
-def get_or_create_category_chain(breadcrumb_string):
-    categories = [cat.strip() for cat in breadcrumb_string.split(">")]
-    parent_id = 0
-    final_id = None
-
-    for cat in categories:
-        cat = cat.replace("&", "&amp;")
-        res = make_request(
-            "GET",
-            f"{WC_URL}/wp-json/wc/v3/products/categories",
-            auth=(WC_KEY, WC_SECRET),
-            params={"search": cat, "parent": parent_id}
-        )
+# Індекс дерева категорій та відповідностей breadcrumb -> ID, спільний для всіх батчів процесу
+category_index = CategoryIndex('data/wc_categories.json' if persist_categories else None, WC_URL)
 
-        if not res:
-            print(f"❌ Не вдалося отримати категорії для '{cat}'")
-            return None
+# Функція для завантаження всього дерева категорій в індекс (один раз на процес).
+# Збережений індекс використовується, якщо кількість категорій та ID найновішої не змінились
+def load_categories():
+    if category_index.loaded():
+        return
 
-        try:
-            data = res.json()
-        except Exception as e:
-            print(f"❌ Некоректний JSON у відповіді: {res.text}")
-            raise e
-        cat_obj = next((c for c in data if c["name"].lower() == cat.lower()), None)
+    url = f"{WC_URL}/wp-json/wc/v3/products/categories"
+    if category_index.cached():
+        r = make_request("GET", url, auth=(WC_KEY, WC_SECRET), params={"per_page": 1, "orderby": "id", "order": "desc"})
+        if r is not None and "X-WP-Total" in r.headers:
+            data = r.json()
+            if category_index.revalidate(int(r.headers["X-WP-Total"]), data[0]["id"] if data else 0):
+                return
+
+    categories = []
+    page = 1
+    while True:
+        r = make_request("GET", url, auth=(WC_KEY, WC_SECRET), params={"per_page": 100, "page": page})
+        if r is None:
+            raise RuntimeError("Не вдалося завантажити категорії")
+
+        data = r.json()
+        categories.extend((c["id"], c["parent"], c["name"]) for c in data)
+        if len(data) < 100:
+            break
+        page += 1
+
+    category_index.replace(categories)
+    category_index.save()
+    print(f"✅ Завантажено категорій: {len(categories)}")
+
+# Функція для створення категорії. Повертає ID (також якщо категорія вже існує) або None
+def create_category(name, parent_id):
+    res = make_request(
+        "POST",
+        f"{WC_URL}/wp-json/wc/v3/products/categories",
+        expected=(200, 201, 400),
+        auth=(WC_KEY, WC_SECRET),
+        json={"name": name.replace("&", "&amp;"), "parent": parent_id}
+    )
+    if res is None:
+        print(f"❌ Запит створення категорії '{name}' не дав відповіді")
+        return None
 
-        if cat_obj:
-            final_id = cat_obj["id"]
-            parent_id = final_id
-            continue
+    new_cat = res.json()
+    if res.status_code in [200, 201] and "id" in new_cat:
+        category_id = new_cat["id"]
+    elif new_cat.get("code") == "term_exists":
+        category_id = new_cat["data"]["resource_id"]
+    else:
+        print(f"❌ Помилка створення категорії '{name}': {new_cat}")
+        return None
 
-        new_res = make_request(
-            "POST",
-            f"{WC_URL}/wp-json/wc/v3/products/categories",
-            auth=(WC_KEY, WC_SECRET),
-            json={"name": cat, "parent": parent_id}
-        )
+    category_index.add(category_id, parent_id, name)
+    return category_id
 
-        if not new_res:
-            print(f"❌ Запит створення категорії '{cat}' не дав відповіді")
-            return None
+# Функція для отримання або створення категорії з ланцюжком (breadcrumb).
+# Рівні шукаються в індексі дерева категорій, відсутні створюються зверху вниз
+def get_or_create_category_chain(breadcrumb_string):
+    load_categories()
 
-        new_cat = new_res.json()
+    final_id = category_index.breadcrumb(breadcrumb_string)
+    if final_id:
+        return final_id
 
-        if "id" in new_cat:
-            final_id = new_cat["id"]
-            parent_id = final_id
-        elif new_cat.get("code") == "term_exists":
-            final_id = new_cat["data"]["resource_id"]
-            parent_id = final_id
-        else:
-            print(f"❌ Помилка створення категорії '{cat}': {new_cat}")
+    parent_id = 0
+    for cat in split_breadcrumb(breadcrumb_string):
+        final_id = category_index.child(parent_id, cat) or create_category(cat, parent_id)
+        if not final_id:
             return None
+        parent_id = final_id
 
+    if final_id:
+        category_index.set_breadcrumb(breadcrumb_string, final_id)
     return final_id
 
 
 if __name__ == "__main__":
-    import time
-
-    add_batch_to_queue('data/batches/batch_0.json')
-    # time.sleep(1)  # Затримка для демонстрації асинхронності
-
-    # add_batch_to_queue('data/batches/batch_1.json')
-    # time.sleep(1)  # Затримка для демонстрації асинхронності
-
-    # add_batch_to_queue('data/batches/batch_2.json')
-    # time.sleep(1)  # Затримка для демонстрації асинхронності
-
-    # add_batch_to_queue('data/batches/batch_3.json')
-    # time.sleep(1)  # Затримка для демонстрації асинхронності
-
-    # add_batch_to_queue('data/batches/batch_4.json')
-    # time.sleep(1)  # Затримка для демонстрації асинхронності
+    # Парсери пишуть готові батчі у data/batches/products_*.ndjson.gz (.ndjson.zst або .ndjson залежно
+    # від output_compression). Файли з суфіксом .part ще записуються, тому пропускаються
+    batch_paths = sorted(path for path in glob.glob('data/batches/*.ndjson*') if path.endswith(NDJSON_SUFFIXES))
+    if not batch_paths:
+        print("❌ Файли батчів не знайдено в data/batches")
+
+    for batch_path in batch_paths:
+        add_batch_to_queue(batch_path)
 
     # Очікуємо завершення обробки всіх батчів
     batch_queue.join()
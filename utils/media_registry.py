@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Функція для нормалізації URL зображення: регістр схеми та хоста, без фрагмента, параметри відсортовані
+def normalize_image_url(url):
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ''))
+
+# Реєстр завантажених у медіатеку WordPress зображень у SQLite: нормалізований URL джерела
+# та SHA-256 вмісту -> ID медіа, окремо для кожного магазину. Дозволяє не завантажувати
+# однакові зображення повторно ні в межах батчу, ні між запусками
+class MediaRegistry:
+    # Кількість локів для хешів вмісту: набір фіксований, тому пам'ять не росте з кількістю зображень
+    HASH_LOCK_STRIPES = 64
+
+    def __init__(self, path, shop_url):
+        self.shop_url = shop_url
+        self.lock = threading.Lock()
+        self.hash_locks = [threading.Lock() for _ in range(self.HASH_LOCK_STRIPES)]
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS media_urls (
+                shop_url TEXT NOT NULL,
+                url TEXT NOT NULL,
+                media_id INTEGER NOT NULL,
+                PRIMARY KEY (shop_url, url)
+            )
+        ''')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS media_hashes (
+                shop_url TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                media_id INTEGER NOT NULL,
+                PRIMARY KEY (shop_url, hash)
+            )
+        ''')
+
+    # ID медіа за URL джерела (None, якщо зображення ще не завантажувалось)
+    def by_url(self, url):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT media_id FROM media_urls WHERE shop_url = ? AND url = ?', (self.shop_url, normalize_image_url(url))
+            ).fetchone()
+        return row[0] if row else None
+
+    # ID медіа за хешем вмісту (None, якщо такого вмісту ще не було)
+    def by_hash(self, digest):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT media_id FROM media_hashes WHERE shop_url = ? AND hash = ?', (self.shop_url, digest)
+            ).fetchone()
+        return row[0] if row else None
+
+    # Збереження відповідності URL та хешу вмісту ID медіа
+    def save(self, url, digest, media_id):
+        with self.lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO media_urls (shop_url, url, media_id) VALUES (?, ?, ?)',
+                (self.shop_url, normalize_image_url(url), media_id)
+            )
+            if digest:
+                self.db.execute(
+                    'INSERT OR REPLACE INTO media_hashes (shop_url, hash, media_id) VALUES (?, ?, ?)',
+                    (self.shop_url, digest, media_id)
+                )
+
+    # Видалення застарілого ID медіа (наприклад, файл видалили з медіатеки)
+    def forget(self, media_id):
+        with self.lock:
+            self.db.execute('DELETE FROM media_urls WHERE shop_url = ? AND media_id = ?', (self.shop_url, media_id))
+            self.db.execute('DELETE FROM media_hashes WHERE shop_url = ? AND media_id = ?', (self.shop_url, media_id))
+
+    # Лок для вмісту з однаковим хешем, щоб однакові зображення з різних URL не завантажувались одночасно.
+    # Різні хеші можуть потрапити на один лок, тоді їх завантаження просто відбувається по черзі
+    def hash_lock(self, digest):
+        return self.hash_locks[int(digest[:4], 16) % len(self.hash_locks)]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import bisect
+import threading
+import configparser
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Завантажуємо конфігурацію
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+metrics_enabled = config.getboolean('METRICS', 'enabled', fallback=True)
+snapshot_seconds = config.getfloat('METRICS', 'snapshot_seconds', fallback=30)
+json_path = config.get('METRICS', 'json_path', fallback='data/metrics.json')
+prometheus_path = config.get('METRICS', 'prometheus_path', fallback='data/metrics.prom')
+http_port = config.getint('METRICS', 'http_port', fallback=0)
+
+# Межі кошиків гістограм тривалості (секунди)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Гістограма з фіксованими кошиками (як у Prometheus: кожен кошик рахує значення <= межі)
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    # Накопичувальні значення кошиків для експорту
+    def cumulative(self):
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+# Реєстр метрик процесу: лічильники, поточні значення та гістограми з мітками.
+# Спільний для парсерів та імпортера, безпечний для використання з кількох потоків
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.exporter = None
+        self.server = None
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted((labels or {}).items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self.key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    # Вимірювання тривалості блоку коду в гістограму name
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    # Запис одного HTTP-запиту: кількість за статусом, байти та тривалість
+    def record_request(self, client, status, latency, size=0, **labels):
+        self.inc('http_requests_total', client=client, status=str(status), **labels)
+        if size:
+            self.inc('http_response_bytes_total', size, client=client, **labels)
+        self.observe('http_request_seconds', latency, client=client, **labels)
+
+    # Знімок усіх метрик у вигляді словника (для JSON)
+    def snapshot(self):
+        uptime = time.time() - self.started_at
+        with self.lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self.counters.items()]
+            gauges = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self.gauges.items()]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": round(histogram.sum, 6),
+                    "avg": round(histogram.sum / histogram.count, 6) if histogram.count else 0,
+                    "buckets": {str(bound): count for bound, count in histogram.cumulative()},
+                }
+                for (name, labels), histogram in self.histograms.items()
+            ]
+
+        # Швидкість збору продуктів за весь час роботи процесу
+        rates = {}
+        for counter in counters:
+            if counter["name"] == 'products_total':
+                client = counter["labels"].get("client", "")
+                rates[client] = round(counter["value"] / uptime, 3) if uptime > 0 else 0
+
+        return {
+            "timestamp": time.time(),
+            "uptime_seconds": round(uptime, 3),
+            "products_per_second": rates,
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+        }
+
+    # Експорт у текстовому форматі Prometheus
+    def prometheus(self):
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+        def format_labels(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ''
+            return '{' + ','.join(f'{k}="{escape(v)}"' for k, v in items) + '}'
+
+        lines = []
+        typed = set()
+        uptime = time.time() - self.started_at
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} counter')
+                    typed.add(name)
+                lines.append(f'{name}{format_labels(labels)} {value}')
+
+            for (name, labels), value in sorted(self.gauges.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} gauge')
+                    typed.add(name)
+                lines.append(f'{name}{format_labels(labels)} {value}')
+
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} histogram')
+                    typed.add(name)
+                for bound, count in histogram.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f'{name}_bucket{format_labels(labels, [("le", le)])} {count}')
+                lines.append(f'{name}_sum{format_labels(labels)} {histogram.sum}')
+                lines.append(f'{name}_count{format_labels(labels)} {histogram.count}')
+
+        lines.append('# TYPE process_uptime_seconds gauge')
+        lines.append(f'process_uptime_seconds {uptime}')
+        return '\n'.join(lines) + '\n'
+
+    # Запис знімка у JSON та Prometheus-файли (через тимчасові файли, щоб читач не побачив половину)
+    def write(self):
+        for path, content in ((json_path, lambda: json.dumps(self.snapshot(), ensure_ascii=False, indent=2)),
+                              (prometheus_path, self.prometheus)):
+            if not path:
+                continue
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content())
+            os.replace(tmp_path, path)
+
+    # Запуск періодичного запису знімків та HTTP-сервера метрик (якщо вказано порт). Повторні виклики ігноруються
+    def start(self):
+        if not metrics_enabled:
+            return
+        with self.lock:
+            if self.exporter is not None:
+                return
+            self.exporter = threading.Thread(target=self.export_loop, daemon=True)
+        self.exporter.start()
+
+        if http_port:
+            self.server = ThreadingHTTPServer(('127.0.0.1', http_port), make_handler(self))
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            print(f"📈 Метрики: http://127.0.0.1:{http_port}/metrics")
+
+    def export_loop(self):
+        while True:
+            time.sleep(snapshot_seconds)
+            try:
+                self.write()
+            except Exception as e:
+                print(f"⚠️ Не вдалося записати метрики: {e}")
+
+    # Фінальний запис знімка після завершення роботи
+    def flush(self):
+        if metrics_enabled:
+            try:
+                self.write()
+            except Exception as e:
+                print(f"⚠️ Не вдалося записати метрики: {e}")
+
+# Обробник HTTP-запитів: /metrics - Prometheus, /metrics.json - JSON
+def make_handler(registry):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = registry.prometheus().encode('utf-8'), 'text/plain; version=0.0.4'
+            elif self.path == '/metrics.json':
+                body, content_type = json.dumps(registry.snapshot(), ensure_ascii=False).encode('utf-8'), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return MetricsHandler
+
+# Спільний реєстр метрик процесу
+metrics = Metrics()
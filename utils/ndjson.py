@@ -0,0 +1,136 @@
+import os
+import io
+import gzip
+import json
+import time
+import zlib
+
+# zstandard - необов'язкова залежність для стиснення zstd
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Запис продуктів у стиснуті NDJSON-файли (один продукт на рядок) з ротацією файлів.
+# Поточний файл має суфікс .part і перейменовується після закриття, тому готові файли завжди цілі.
+# Після закриття кожного файлу викликається on_rotate(path), наприклад для передачі файлу імпортеру
+class NdjsonWriter:
+    def __init__(self, directory, prefix='products', compression='gzip', max_products=1000, max_bytes=256 * 1024 * 1024, fsync_every=100, on_rotate=None):
+        if compression == 'zstd' and zstandard is None:
+            print("⚠️ zstandard не встановлено, використовується стиснення gzip")
+            compression = 'gzip'
+
+        self.directory = directory
+        self.prefix = prefix
+        self.compression = compression
+        self.max_products = max_products
+        self.max_bytes = max_bytes
+        self.fsync_every = fsync_every
+        self.on_rotate = on_rotate
+
+        self.file_index = 0
+        self.raw = None
+        self.stream = None
+        self.path = None
+        self.products = 0
+        self.bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def extension(self):
+        return {'gzip': '.ndjson.gz', 'zstd': '.ndjson.zst'}.get(self.compression, '.ndjson')
+
+    # Відкриття нового файлу
+    def open(self):
+        name = f"{self.prefix}_{time.strftime('%Y%m%d_%H%M%S')}_{self.file_index:05d}{self.extension()}"
+        self.file_index += 1
+        self.path = os.path.join(self.directory, name)
+        self.raw = open(self.path + '.part', 'wb')
+
+        if self.compression == 'gzip':
+            self.stream = gzip.GzipFile(fileobj=self.raw, mode='wb')
+        elif self.compression == 'zstd':
+            self.stream = zstandard.ZstdCompressor().stream_writer(self.raw, closefd=False)
+        else:
+            self.stream = self.raw
+
+        self.products = 0
+        self.bytes = 0
+
+    # Запис одного продукту
+    def write(self, product):
+        if self.stream is None:
+            self.open()
+
+        line = (json.dumps(product, ensure_ascii=False) + '\n').encode('utf-8')
+        self.stream.write(line)
+        self.products += 1
+        self.bytes += len(line)
+
+        if self.fsync_every and self.products % self.fsync_every == 0:
+            self.sync()
+
+        if self.products >= self.max_products or self.bytes >= self.max_bytes:
+            self.rotate()
+
+    # Запис батчу продуктів (можна передавати як product_handler в асинхронний парсер)
+    def write_batch(self, products):
+        for product in products:
+            self.write(product)
+
+    # Скидання стиснутих даних на диск, щоб після збою файл можна було прочитати до останнього запису
+    def sync(self):
+        if self.compression == 'gzip':
+            self.stream.flush(zlib.Z_SYNC_FLUSH)
+        elif self.compression == 'zstd':
+            self.stream.flush(zstandard.FLUSH_BLOCK)
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+
+    # Закриття поточного файлу та передача його далі
+    def rotate(self):
+        if self.stream is None:
+            return
+
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        self.raw.close()
+        os.replace(self.path + '.part', self.path)
+
+        path = self.path
+        self.stream = self.raw = self.path = None
+        if self.on_rotate:
+            self.on_rotate(path)
+
+    def close(self):
+        self.rotate()
+
+# Потокове читання продуктів з NDJSON-файлу (стиснутого або ні) без завантаження всього файлу в пам'ять
+def read_products(path):
+    if path.endswith('.gz'):
+        stream = gzip.open(path, 'rb')
+    elif path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("Для читання .zst потрібен пакет zstandard")
+        stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    else:
+        stream = open(path, 'rb')
+
+    with stream:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+# Читання продуктів з NDJSON-файлу частинами по size штук
+def read_batches(path, size):
+    batch = []
+    for product in read_products(path):
+        batch.append(product)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
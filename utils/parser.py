@@ -3,35 +3,55 @@ import json
 import time
 import configparser
 import requests
-from bs4 import BeautifulSoup
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.extractors import extract_listing, extract_product, extract_variation
+from utils.rate_limiter import HostRateLimiter
+from utils.http_cache import ResponseCache
+from utils.crawl_state import CrawlState
+from utils.fingerprints import FingerprintStore, product_fingerprint
+from utils.dedup import SeenProducts
+from utils.ndjson import NdjsonWriter
+from utils.retry import RetryPolicy, call_with_retries, host_failure_handler
+from utils.metrics import metrics
+from utils.http_session import get_session
 
 # Завантажуємо конфігурацію
 config = configparser.ConfigParser()
 config.read('config.ini')
 
 # Отримуємо налаштування з конфігурації
-requests_delay = config.getint('DEFAULT', 'requests_delay', fallback=1)
-batch_size = config.getint('DEFAULT', 'batch_size', fallback=100)
-
-# Селектори для парсингу
-PRODUCT_LINK_SELECTOR = '.products-list a'
-NEXT_PAGE_SELECTOR = 'a.next-page'
-LAST_PAGE_SELECTOR = '.pagination a:nth-last-child(2)'
-
-TITLE_SELECTOR = ".Product__Details h1.js-product-title"
-PRICE_SELECTOR = ".js-meta-price"
-REGULAR_PRICE_SELECTOR = ".Product__Details .Product__Price del"
-SALE_PRICE_SELECTOR = ".js-meta-price"
-DESCRIPTION_SELECTOR = "#description"
-BRAND_SELECTOR = "ul.product-description-spec-list li:has(strong:-soup-contains('Brand')) span"
-VARIATION_SELECTOR = ".custom-select option"
-SIZE_SELECTOR = ".Product__Details .Product__Title label[for='Size'] span"
-COLOR_SELECTOR = ".Product__Details .Product__Title label[for='Colour'] span"
-AVAILABILITY_SELECTOR = ".Product__BuyBox strong"
-IMAGES_SELECTOR = "button.js-gallery-thumb"
-IMAGE_SELECTOR = "#main .Product .Product__Top .Product__Gallery .ProductGallery.js-hover-zoom img"
-CATEGORIES_SELECTOR = ".Product__Top li.breadcrumb-item a"
+requests_delay = config.getint('PARSER', 'requests_delay', fallback=1)
+batch_size = config.getint('PARSER', 'batch_size', fallback=100)
+max_threads = config.getint('PARSER', 'max_threads', fallback=5)
+product_workers = config.getint('PARSER', 'product_workers', fallback=max_threads)
+max_retries = config.getint('PARSER', 'max_retries', fallback=3)
+retry_max_delay = config.getfloat('PARSER', 'retry_max_delay', fallback=60)
+retry_budget = config.getint('PARSER', 'retry_budget', fallback=10)
+retry_budget_refill = config.getfloat('PARSER', 'retry_budget_refill', fallback=0.5)
+retry_max_throttle_wait = config.getfloat('PARSER', 'retry_max_throttle_wait', fallback=600)
+requests_per_second = config.getfloat('PARSER', 'requests_per_second', fallback=1 / requests_delay if requests_delay > 0 else 0)
+requests_burst = config.getint('PARSER', 'requests_burst', fallback=1)
+use_cache = config.getboolean('PARSER', 'use_cache', fallback=False)
+cache_ttl_hours = config.getfloat('PARSER', 'cache_ttl_hours', fallback=24)
+cache_max_mb = config.getint('PARSER', 'cache_max_mb', fallback=2048)
+resume_crawl = config.getboolean('PARSER', 'resume_crawl', fallback=False)
+resume_max_age_hours = config.getfloat('PARSER', 'resume_max_age_hours', fallback=24)
+incremental = config.getboolean('PARSER', 'incremental', fallback=False)
+dedup_products = config.getboolean('PARSER', 'dedup_products', fallback=True)
+persist_seen_products = config.getboolean('PARSER', 'persist_seen_products', fallback=False)
+output_compression = config.get('PARSER', 'output_compression', fallback='gzip')
+output_max_products = config.getint('PARSER', 'output_max_products', fallback=1000)
+output_max_mb = config.getint('PARSER', 'output_max_mb', fallback=256)
+output_fsync_every = config.getint('PARSER', 'output_fsync_every', fallback=100)
+
+# Обмежувач частоти запитів до кожного хоста, спільний для всіх потоків
+rate_limiter = HostRateLimiter(requests_per_second, requests_burst)
+
+# Політика повторних запитів (експоненційна затримка від requests_delay, Retry-After, бюджет повторів)
+retry_policy = RetryPolicy(max_retries, base_delay=requests_delay, max_delay=retry_max_delay, budget=retry_budget,
+                           refill_rate=retry_budget_refill, max_throttle_wait=retry_max_throttle_wait)
 
 # Заголовки для HTTP-запитів
 HEADERS = {
@@ -41,8 +61,79 @@ HEADERS = {
     'Connection': 'keep-alive'
 }
 
+# Обмеження кількості одночасних запитів з усіх потоків
+request_slots = threading.BoundedSemaphore(max_threads)
+
+# Кеш відповідей на диску (None - кеш вимкнено)
+if use_cache:
+    response_cache = ResponseCache('data/http_cache.sqlite', cache_ttl_hours * 3600, cache_max_mb * 1024 * 1024)
+else:
+    response_cache = None
+
+# Стан обходу для продовження після збою (None - кожен запуск починається з початку)
+if resume_crawl:
+    crawl_state = CrawlState('data/crawl_state.sqlite', resume_max_age_hours * 3600)
+else:
+    crawl_state = None
+
+# Позначка продукту, який не змінився з попереднього запуску (інкрементальний режим): продукт пропускається
+# навмисно, тому вважається обробленим, на відміну від продуктів, які не вдалося зібрати (None)
+UNCHANGED = object()
+
+# Відбитки продуктів з попередніх запусків для інкрементального оновлення (None - збираються всі продукти)
+if incremental:
+    fingerprints = FingerprintStore('data/fingerprints.sqlite')
+else:
+    fingerprints = None
+
+# Множина продуктів, знайдених у будь-якій категорії під час запуску (None - без дедуплікації)
+if dedup_products:
+    seen_products = SeenProducts('data/seen_products.bin' if persist_seen_products else None)
+else:
+    seen_products = None
+
+# Функція для отримання HTML-коду сторінки з урахуванням кешу та обмеження частоти запитів.
+# Тимчасові помилки повторюються згідно з retry_policy, після останньої спроби виняток передається далі
+def get_page(url, headers=None):
+    cached = response_cache.get(url) if response_cache else None
+    if cached and cached.fresh:
+        metrics.inc('cache_hits_total', client='parser')
+        return cached.body
+
+    if cached:
+        headers = {**(headers or {}), **cached.conditional_headers()}
+
+    def request():
+        rate_limiter.acquire_sync(url)
+        started = time.monotonic()
+        try:
+            with request_slots:
+                response = get_session().get(url, headers=headers)
+        except requests.RequestException:
+            metrics.record_request('parser', 'error', time.monotonic() - started)
+            raise
+        metrics.record_request('parser', response.status_code, time.monotonic() - started, len(response.content))
+        if response.status_code != 304 or not cached:
+            response.raise_for_status()
+        return response
+
+    response = call_with_retries(retry_policy, request, host_failure_handler(rate_limiter, url, 'parser'))
+    if response.status_code == 304 and cached:
+        response_cache.refresh(url)
+        return cached.body
+
+    if response_cache is not None:
+        response_cache.store(url, response.content, response.headers)
+    return response.content
+
 # Функція для збору даних про продукти з категорій
 def collect_product_data(categories, product_handler):
+    metrics.start()
+
+    # Пропускаємо категорії, які вже були пройдені до зупинки попереднього запуску
+    if crawl_state is not None:
+        categories = crawl_state.start(categories)
+
     # Прогресбар для відстеження прогресу
     with tqdm(categories, desc="Категорія: ", unit="кат.") as cat_bar:
         # Проходимо по кожній категорії
@@ -57,238 +148,214 @@ def collect_product_data(categories, product_handler):
                 print(f"Помилка при зборі даних для категорії {category}: {e}")
                 time.sleep(requests_delay)
 
+            # Зберігаємо множину знайдених продуктів після кожної категорії
+            if seen_products is not None:
+                seen_products.save()
+
+    # Обхід завершено, множина знайдених продуктів більше не потрібна
+    if seen_products is not None:
+        seen_products.clear()
+
+    # Запуск завершено: наступний почнеться з початку, навіть якщо деякі категорії не вдалося пройти
+    if crawl_state is not None:
+        crawl_state.finish()
+
+    metrics.flush()
+
 # Функція для збору даних з категорії
 def collect_category(category, product_handler):
     page_url = category + "?pageSize=128" # Збільшуємо розмір сторінки для зменшення кількості запитів
+    if crawl_state is not None:
+        page_url = crawl_state.page_url(category) or page_url
 
     last_page_number = None
     page_bar = None
 
+    # Функція для збору та передачі обробнику одного продукту
+    def process_product(full_url):
+        try:
+            product_data = collect_product_page(full_url)
+            if product_data is UNCHANGED:
+                if crawl_state is not None:
+                    crawl_state.mark_done([full_url])
+            elif product_data:
+                # Обробник (наприклад, запис у файл) викликається з кількох потоків, тому по черзі
+                with handler_lock:
+                    product_handler(product_data)
+                metrics.inc('products_total', client='parser')
+                # Відбиток зберігається при записі продукту, невдалий імпорт його видаляє (див. forget_fingerprints в імпортері)
+                if fingerprints is not None:
+                    fingerprints.save([product_data])
+                if crawl_state is not None:
+                    crawl_state.mark_done([full_url])
+        except Exception as e:
+            print(f"Помилка при зборі даних для продукту {full_url}: {e}")
+
+    # Функція для збору списку продуктів: паралельно в пулі потоків або по одному
+    def process_products(product_urls):
+        with tqdm(total=len(product_urls), desc="Збір продуктів", unit="продукт") as product_bar:
+            if product_executor is None:
+                for full_url in product_urls:
+                    process_product(full_url)
+                    product_bar.update(1)
+            else:
+                futures = [product_executor.submit(process_product, full_url) for full_url in product_urls]
+                for _ in as_completed(futures):
+                    product_bar.update(1)
+
+    # Спочатку збираємо продукти, які не встигли обробити до зупинки попереднього запуску
+    if crawl_state is not None:
+        process_products([full_url for full_url, _ in crawl_state.queued_products(category)])
+
     # Цикл для збору продуктів з категорії по сторінках
     while True:
-        response = requests.get(page_url, headers=HEADERS)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
+        html = get_page(page_url, headers=HEADERS)
+        with metrics.timer('parse_seconds', client='parser', page='listing'):
+            listing = extract_listing(html)
 
-        if not last_page_number:
+        if not last_page_number and listing["last_page_number"]:
             # Знаходимо останню сторінку, якщо вона є
-            last_page_element = soup.select_one(LAST_PAGE_SELECTOR)
-            if last_page_element:
-                last_page_number = int(last_page_element.get_text(strip=True))
-                page_bar = tqdm(total=last_page_number, desc="Парсинг сторінок категорії", unit="стр.")
+            last_page_number = listing["last_page_number"]
+            page_bar = tqdm(total=last_page_number, desc="Парсинг сторінок категорії", unit="стр.")
 
         if page_bar:
             page_bar.update(1)
         
-        products = soup.select(PRODUCT_LINK_SELECTOR)
-        with tqdm(products, desc="Збір продуктів", unit="продукт") as product_bar:
-            for product in product_bar:
-                url = product.get('href')
-                if url:
-                    full_url = "https://www.fruugo.co.uk" + url if url.startswith("/") else url
-                    try:
-                        product_data = collect_product_page(full_url)
-                        if product_data:
-                            product_handler(product_data)
-                    except Exception as e:
-                        print(f"Помилка при зборі даних для продукту {full_url}: {e}")
-
-                    time.sleep(requests_delay)  # Затримка між запитами для уникнення блокування
-
-        # Перевірка наявності кнопки "Наступна сторінка"
-        next_page = soup.select_one(NEXT_PAGE_SELECTOR)
-        if not next_page or 'disabled' in next_page.get('class', []):
-            print("Наступна сторінка не знайдена або вона вимкнена.")
-            break
-        else:
-            next_page_url = next_page.get('href')
-            if next_page_url:
-                page_url = "https://www.fruugo.co.uk" + next_page_url if next_page_url.startswith("/") else next_page_url
-            else:
-                print("URL наступної сторінки не знайдено.")
-                break
+        # Відкидаємо продукти, які вже зустрічались у цій або інших категоріях
+        product_urls = listing["product_urls"]
+        if seen_products is not None:
+            product_urls = [full_url for full_url in product_urls if seen_products.add(full_url)]
 
-        time.sleep(requests_delay)
+        # Зберігаємо продукти сторінки у стані обходу, відкидаючи вже відомі
+        if crawl_state is not None:
+            product_urls = crawl_state.add_products(category, page_url, product_urls)
 
-# Функція для збору даних про продукт за URL
-def collect_product_page(url):
-    response = requests.get(url)
-    response.raise_for_status()
-    soup = BeautifulSoup(response.text, 'html.parser')
-
-    # Отримання заголовку
-    title = soup.select_one(TITLE_SELECTOR)
-    if title:
-        title = title.get_text(strip=True)
-    else:
-        print(f"Не вдалося знайти назву продукту на сторінці {url}")
-        return None
+        process_products(product_urls)
 
-    # Функція для очищення та перетворення тексту ціни у число
-    def extract_price(text):
-        if not text:
-            return None
-        cleaned = re.sub(r"[^\d.]", "", text)
-        try:
-            return float(cleaned)
-        except ValueError:
-            return None
+        # Перехід на наступну сторінку
+        if not listing["next_page_url"]:
+            print("Наступна сторінка не знайдена або вона вимкнена.")
+            break
+        page_url = listing["next_page_url"]
 
-    # Отримання цін
-    regular_price = soup.select_one(REGULAR_PRICE_SELECTOR)
-    if regular_price:
-        regular_price = extract_price(regular_price.get_text(strip=True))
+        if crawl_state is not None:
+            crawl_state.set_page(category, page_url)
 
-        sale_price = soup.select_one(SALE_PRICE_SELECTOR)
-        if sale_price:
-            sale_price = extract_price(sale_price.get_text(strip=True))
-        else:
-            sale_price = None
-    else:
-        sale_price = None
+    # Категорія пройдена повністю
+    if crawl_state is not None:
+        crawl_state.finish_category(category)
 
-        regular_price = soup.select_one(PRICE_SELECTOR)
-        if regular_price:
-            regular_price = extract_price(regular_price.get_text(strip=True))
-        else:
-            print(f"Не вдалося знайти ціну продукту на сторінці {url}")
-            return None
-
-    # Отримання опису
-    description = soup.select_one(DESCRIPTION_SELECTOR)
-    if description:
-        description = str(description)
-    else:
-        print(f"Не вдалося знайти опис продукту на сторінці {url}")
+# Функція для збору даних про продукт за URL
+def collect_product_page(url):
+    html = get_page(url)
+    with metrics.timer('parse_seconds', client='parser', page='product'):
+        page = extract_product(html, url)
+
+    for warning in page["warnings"]:
+        print(warning)
+    if page["error"]:
+        print(page["error"])
         return None
 
-    # Отримання категорії
-    categories = soup.select(CATEGORIES_SELECTOR)
-    if categories:
-        categories = " > ".join([cat.get_text(strip=True) for cat in categories])
-    else:
-        print(f"Не вдалося знайти категорії продукту на сторінці {url}")
-        categories = None
-
-    # Отримання бренду
-    brand = soup.select_one(BRAND_SELECTOR)
-    if brand:
-        brand = brand.get_text(strip=True)
-    else:
-        brand = None
-
-    # Функція для отримання варіації за URL
-    def get_variation_by_url(variation_url):
-        try:
-            match = re.search(r'/p-(\d+)-(\d+)', variation_url)
-            if match:
-                product_id, variant_id = match.groups()
-                sku = f"SKU-{product_id}-{variant_id}"
-            else:
-                print(f"Не вдалося отримати ID продукту з URL: {variation_url}")
-                return None
-            
-            response = requests.get(variation_url)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Отримання розміру
-            size = soup.select(SIZE_SELECTOR)
-            if size:
-                size = size[0].get_text(strip=True)
-            else:
-                size = None
+    # Якщо продукт не змінився з попереднього запуску, варіації не завантажуємо
+    fingerprint = product_fingerprint(page)
+    if fingerprints is not None and fingerprints.unchanged(url, fingerprint):
+        metrics.inc('products_unchanged_total', client='parser')
+        return UNCHANGED
 
-            # Отримання кольору
-            color = soup.select(COLOR_SELECTOR)
-            if color:
-                color = color[0].get_text(strip=True)
-            else:
-                color = None
+    variation_urls = [re.sub(r'(p-\d+)', rf'\1-{id}', url) for id in page["variation_ids"]]
 
-            # Отримання наявності
-            availability = soup.select_one(AVAILABILITY_SELECTOR)
-            if availability:
-                availability_text = availability.get_text(strip=True)
-                availability = availability_text == "In stock"
-            else:
-                availability = None
+    # Паралельне отримання варіацій через спільний пул потоків
+    futures = [get_variation_once(variation_url) for variation_url in variation_urls]
 
-            # Отримання зображень
-            images = soup.select(IMAGES_SELECTOR)
-            if images:
-                images = [img.get('data-image') for img in images]
-            else:
-                image = soup.select_one(IMAGE_SELECTOR)
-                if image:
-                    images = [image.get('src')]
-                else:
-                    images = []
-
-        except requests.RequestException as e:
-            print(f"Помилка при отриманні варіації з {variation_url}: {e}")
-            return None
-        return {
-            "sku": sku,
-            "size": size,
-            "color": color,
-            "availability": availability,
-            "images": images
-        }
-    
-    # Отримання id варіацій
-    variations_options = soup.select(VARIATION_SELECTOR)
     variations = []
-    all_variation_ids = []
     images = []
-    for variation_option in variations_options:
-        value = variation_option.get('value', '')
-
-        match = re.search(r'\[([^\]]+)\]', value)
-        if match:
-            ids = match.group(1).split(', ')
-        
-        for id in ids:
-            if id in all_variation_ids:
-                continue
-
-            all_variation_ids.append(id)
-            variation_url = re.sub(r'(p-\d+)', rf'\1-{id}', url)
-
-            variation_data = get_variation_by_url(variation_url)
-            if variation_data:
-                variations.append(variation_data)
-                for img in variation_data.get("images", []):
-                    if img not in images:
-                        images.append(img)
+    for future in futures:
+        variation_data = future.result()
+        # Продукт без частини варіацій не передається обробнику і не отримує відбиток,
+        # тому наступний запуск збере його повторно
+        if not variation_data:
+            print(f"Не всі варіації отримано, продукт {url} буде зібрано повторно")
+            metrics.inc('products_incomplete_total', client='parser')
+            return None
+        variations.append(variation_data)
+        for img in variation_data.get("images", []):
+            if img not in images:
+                images.append(img)
     
     product_data = {
-        "title": title,
+        "title": page["title"],
         "url": url,
-        "regular_price": regular_price,
-        "sale_price": sale_price,
-        "description": description,
-        "categories": categories,
+        "regular_price": page["regular_price"],
+        "sale_price": page["sale_price"],
+        "description": page["description"],
+        "categories": page["categories"],
         "images": images,
-        "brand": brand,
+        "brand": page["brand"],
         "variations": variations,
+        "fingerprint": fingerprint,
     }
     return product_data
 
+# Функція для отримання варіації за URL
+def get_variation_by_url(variation_url):
+    try:
+        match = re.search(r'/p-(\d+)-(\d+)', variation_url)
+        if match:
+            product_id, variant_id = match.groups()
+            sku = f"SKU-{product_id}-{variant_id}"
+        else:
+            print(f"Не вдалося отримати ID продукту з URL: {variation_url}")
+            return None
+        
+        html = get_page(variation_url)
+        with metrics.timer('parse_seconds', client='parser', page='variation'):
+            variation = extract_variation(html)
+
+    except requests.RequestException as e:
+        print(f"Помилка при отриманні варіації з {variation_url}: {e}")
+        return None
+    return {"sku": sku, **variation}
+
+# Спільний пул потоків для завантаження варіацій
+variation_executor = ThreadPoolExecutor(max_workers=max_threads)
+
+# Пул потоків для паралельного збору продуктів сторінки (None - продукти збираються по одному)
+product_executor = ThreadPoolExecutor(max_workers=product_workers) if product_workers > 1 else None
+handler_lock = threading.Lock()
+
+# Завантаження варіацій, які виконуються зараз (URL -> Future)
+variation_futures = {}
+variation_futures_lock = threading.Lock()
+
+# Функція для отримання варіації з об'єднанням однакових запитів: якщо ця ж варіація
+# вже завантажується, повертаємо той самий Future замість повторного запиту
+def get_variation_once(variation_url):
+    with variation_futures_lock:
+        future = variation_futures.get(variation_url)
+        if future is None:
+            future = variation_executor.submit(get_variation_by_url, variation_url)
+            variation_futures[variation_url] = future
+            future.add_done_callback(lambda _: variation_futures.pop(variation_url, None))
+    return future
+
 # Приклад використання функції
 if __name__ == "__main__":
     with open('data/categories.json', 'r', encoding='utf-8') as f:
         categories = json.load(f)
 
-    products = []
-
-    def test_handler(data):
-        products.append(data)
-
-        with open('data/products_data.json', 'w', encoding='utf-8') as f:
-            json.dump(products, f, ensure_ascii=False, indent=2)
-
-    collect_product_data(categories, test_handler)
+    # Кожен продукт дописується у стиснутий NDJSON-файл замість повного перезапису products_data.json
+    writer = NdjsonWriter(
+        'data/batches',
+        compression=output_compression,
+        max_products=output_max_products,
+        max_bytes=output_max_mb * 1024 * 1024,
+        fsync_every=output_fsync_every,
+    )
+    try:
+        collect_product_data(categories, writer.write)
+    finally:
+        writer.close()
 
 
         
\ No newline at end of file
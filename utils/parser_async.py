@@ -1,12 +1,25 @@
 import json
 import configparser
-from bs4 import BeautifulSoup
 import re
+import time
 import asyncio
-from itertools import cycle
+import inspect
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse, parse_qs, urlencode
 from tqdm import tqdm
 import aiohttp
 from aiohttp import ClientTimeout
+from utils.extractors import extract_listing, extract_product, extract_variation
+from utils.rate_limiter import HostRateLimiter
+from utils.proxy_pool import ProxyPool, ProxyBannedError
+from utils.http_cache import ResponseCache
+from utils.crawl_state import CrawlState
+from utils.fingerprints import FingerprintStore, product_fingerprint
+from utils.dedup import SeenProducts
+from utils.ndjson import NdjsonWriter
+from utils.concurrency import AdaptiveLimiter
+from utils.retry import RetryPolicy, call_with_retries_async, host_failure_handler
+from utils.metrics import metrics
 
 # Завантажуємо конфігурацію
 config = configparser.ConfigParser()
@@ -18,35 +31,61 @@ max_threads = config.getint('PARSER', 'max_threads', fallback=5)
 max_retries = config.getint('PARSER', 'max_retries', fallback=3)
 requests_delay = config.getint('PARSER', 'requests_delay', fallback=1)
 batch_size = config.getint('PARSER', 'batch_size', fallback=100)
-
-# Якщо використовується проксі, завантажуємо список проксі з файлу
-if use_proxy:
-    with open('proxies.txt', 'r', encoding='utf-8') as f:
-        proxies = [line.strip() for line in f if line.strip()]
-    proxy_cycle = cycle(proxies)
+product_workers = config.getint('PARSER', 'product_workers', fallback=max_threads)
+parse_processes = config.getint('PARSER', 'parse_processes', fallback=0)
+requests_per_second = config.getfloat('PARSER', 'requests_per_second', fallback=1 / requests_delay if requests_delay > 0 else 0)
+requests_burst = config.getint('PARSER', 'requests_burst', fallback=1)
+proxy_ban_seconds = config.getint('PARSER', 'proxy_ban_seconds', fallback=60)
+proxy_max_failures = config.getint('PARSER', 'proxy_max_failures', fallback=3)
+use_cache = config.getboolean('PARSER', 'use_cache', fallback=False)
+cache_ttl_hours = config.getfloat('PARSER', 'cache_ttl_hours', fallback=24)
+cache_max_mb = config.getint('PARSER', 'cache_max_mb', fallback=2048)
+resume_crawl = config.getboolean('PARSER', 'resume_crawl', fallback=False)
+resume_max_age_hours = config.getfloat('PARSER', 'resume_max_age_hours', fallback=24)
+incremental = config.getboolean('PARSER', 'incremental', fallback=False)
+dedup_products = config.getboolean('PARSER', 'dedup_products', fallback=True)
+persist_seen_products = config.getboolean('PARSER', 'persist_seen_products', fallback=False)
+parallel_pages = config.getboolean('PARSER', 'parallel_pages', fallback=True)
+page_workers = config.getint('PARSER', 'page_workers', fallback=max_threads)
+output_compression = config.get('PARSER', 'output_compression', fallback='gzip')
+output_max_products = config.getint('PARSER', 'output_max_products', fallback=1000)
+output_max_mb = config.getint('PARSER', 'output_max_mb', fallback=256)
+output_fsync_every = config.getint('PARSER', 'output_fsync_every', fallback=100)
+adaptive_concurrency = config.getboolean('PARSER', 'adaptive_concurrency', fallback=True)
+min_concurrency = config.getint('PARSER', 'min_concurrency', fallback=1)
+max_concurrency = config.getint('PARSER', 'max_concurrency', fallback=max_threads * 4)
+latency_tolerance = config.getfloat('PARSER', 'latency_tolerance', fallback=2.0)
+request_timeout = config.getint('PARSER', 'request_timeout', fallback=60)
+retry_max_delay = config.getfloat('PARSER', 'retry_max_delay', fallback=60)
+retry_budget = config.getint('PARSER', 'retry_budget', fallback=10)
+retry_budget_refill = config.getfloat('PARSER', 'retry_budget_refill', fallback=0.5)
+retry_max_throttle_wait = config.getfloat('PARSER', 'retry_max_throttle_wait', fallback=600)
+
+# Обмеження кількості одночасних запитів. Починаємо з max_threads; в адаптивному режимі ліміт
+# росте, поки сайт відповідає швидко, і зменшується при 429/503/таймаутах. Без нього ліміт фіксований
+if adaptive_concurrency:
+    sem = AdaptiveLimiter(max_threads, min_limit=min_concurrency, max_limit=max_concurrency, latency_tolerance=latency_tolerance)
 else:
-    proxy_cycle = None
-
-sem = asyncio.Semaphore(max_threads)
-
-# Селектори для парсингу
-PRODUCT_LINK_SELECTOR = '.products-list a'
-NEXT_PAGE_SELECTOR = 'a.next-page'
-LAST_PAGE_SELECTOR = '.pagination a:nth-last-child(2)'
-
-TITLE_SELECTOR = ".Product__Details h1.js-product-title"
-PRICE_SELECTOR = ".js-meta-price"
-REGULAR_PRICE_SELECTOR = ".Product__Details .Product__Price del"
-SALE_PRICE_SELECTOR = ".js-meta-price"
-DESCRIPTION_SELECTOR = "#description"
-BRAND_SELECTOR = "ul.product-description-spec-list li:has(strong:-soup-contains('Brand')) span"
-AVAILABILITY_SELECTOR = ".Product__BuyBox strong"
-IMAGES_SELECTOR = "button.js-gallery-thumb"
-IMAGE_SELECTOR = "#main .Product .Product__Top .Product__Gallery .ProductGallery.js-hover-zoom img"
-CATEGORIES_SELECTOR = ".Product__Top li.breadcrumb-item a"
-VARIATION_SELECTOR = ".custom-select option"
-SIZE_SELECTOR = ".Product__Details .Product__Title label[for='Size'] span"
-COLOR_SELECTOR = ".Product__Details .Product__Title label[for='Colour'] span"
+    sem = AdaptiveLimiter(max_threads, min_limit=max_threads, max_limit=max_threads)
+
+# Статуси відповіді, якими сервер сигналізує про перевантаження
+OVERLOAD_STATUSES = {429, 503}
+
+# Функція для визначення, чи є помилка запиту ознакою перевантаження сервера
+def is_overload(exception):
+    if isinstance(exception, (asyncio.TimeoutError, ProxyBannedError)):
+        return True
+    return isinstance(exception, aiohttp.ClientResponseError) and exception.status in OVERLOAD_STATUSES
+
+# Обмежувач частоти запитів до кожного хоста (не займає слот ліміту одночасних запитів під час очікування)
+rate_limiter = HostRateLimiter(requests_per_second, requests_burst)
+
+# Політика повторних запитів (експоненційна затримка від requests_delay, Retry-After, бюджет повторів)
+retry_policy = RetryPolicy(max_retries, base_delay=requests_delay, max_delay=retry_max_delay, budget=retry_budget,
+                           refill_rate=retry_budget_refill, max_throttle_wait=retry_max_throttle_wait)
+
+# Пул процесів для розбору HTML (None - розбір виконується в потоці циклу подій)
+parse_executor = None
 
 # Заголовки для HTTP-запитів
 HEADERS = {
@@ -56,115 +95,363 @@ HEADERS = {
     'Connection': 'keep-alive'
 }
 
-# Асинхронна функція для отримання HTML-коду сторінки
-async def fetch(session, url):
-    for attempt in range(max_retries):
-        proxy = next(proxy_cycle) if proxy_cycle else None
+# Якщо використовується проксі, завантажуємо список проксі з файлу
+if use_proxy:
+    with open('proxies.txt', 'r', encoding='utf-8') as f:
+        proxies = [line.strip() for line in f if line.strip()]
+    proxy_pool = ProxyPool(
+        proxies,
+        ban_seconds=proxy_ban_seconds,
+        max_failures=proxy_max_failures,
+        connections_per_proxy=max_concurrency,
+        headers=HEADERS,
+        timeout=ClientTimeout(total=request_timeout or None)
+    )
+else:
+    proxy_pool = None
+
+# Кеш відповідей на диску (None - кеш вимкнено)
+if use_cache:
+    response_cache = ResponseCache('data/http_cache.sqlite', cache_ttl_hours * 3600, cache_max_mb * 1024 * 1024)
+else:
+    response_cache = None
+
+# Стан обходу для продовження після збою (None - кожен запуск починається з початку)
+if resume_crawl:
+    crawl_state = CrawlState('data/crawl_state.sqlite', resume_max_age_hours * 3600)
+else:
+    crawl_state = None
+
+# Позначка продукту, який не змінився з попереднього запуску (інкрементальний режим): продукт пропускається
+# навмисно, тому вважається обробленим, на відміну від продуктів, які не вдалося зібрати (None)
+UNCHANGED = object()
+
+# Відбитки продуктів з попередніх запусків для інкрементального оновлення (None - збираються всі продукти)
+if incremental:
+    fingerprints = FingerprintStore('data/fingerprints.sqlite')
+else:
+    fingerprints = None
+
+# Множина продуктів, знайдених у будь-якій категорії під час запуску (None - без дедуплікації)
+if dedup_products:
+    seen_products = SeenProducts('data/seen_products.bin' if persist_seen_products else None)
+else:
+    seen_products = None
+
+# Функція для виконання одного GET-запиту (через проксі з пулу, якщо він увімкнений).
+# Якщо передано запис з кешу, запит робиться умовним і при відповіді 304 повертається тіло з кешу
+async def get_page(session, url, cached=None):
+    headers = cached.conditional_headers() if cached else None
+    started = time.monotonic()
+
+    if proxy_pool is None:
         try:
-            async with sem:
-                async with session.get(url, proxy=proxy) as response:
-                    response.raise_for_status()
-                    text = await response.text()
-                await asyncio.sleep(requests_delay)
-            return text
-        except Exception as e:
-            if attempt == max_retries - 1:
-                print(f"❌ Не вдалося отримати {url}: {e}")
-            await asyncio.sleep(requests_delay)
-    return None
-
-# Асинхронна функція для отримання HTML-коду сторінки варіації
-async def variation_fetch(session, url):
-    for attempt in range(max_retries):
-        proxy = next(proxy_cycle) if proxy_cycle else None
+            async with session.get(url, headers=headers) as response:
+                text = await response.read()
+        except Exception:
+            metrics.record_request('parser_async', 'error', time.monotonic() - started)
+            raise
+        metrics.record_request('parser_async', response.status, time.monotonic() - started, len(text))
+    else:
+        proxy = proxy_pool.choose()
         try:
-            async with session.get(url, proxy=proxy) as response:
-                response.raise_for_status()
-                text = await response.text()
-            return text
-        except Exception as e:
-            if attempt == max_retries - 1:
-                print(f"❌ Не вдалося отримати {url}: {e}")
-    return None
+            async with proxy_pool.session(proxy).get(url, proxy=proxy.url, headers=headers) as response:
+                text = await response.read()
+        except Exception:
+            metrics.record_request('parser_async', 'error', time.monotonic() - started)
+            proxy_pool.report_failure(proxy)
+            raise
+
+        metrics.record_request('parser_async', response.status, time.monotonic() - started, len(text))
+        proxy_pool.check_response(proxy, response.status, text, time.monotonic() - started)
+
+    if response.status == 304 and cached:
+        response_cache.refresh(url)
+        return cached.body
+
+    response.raise_for_status()
+    if response_cache is not None:
+        response_cache.store(url, text, response.headers)
+    return text
+
+# Асинхронна функція для отримання HTML-коду сторінки (основної або варіації).
+# Тимчасові помилки повторюються з експоненційною затримкою згідно з retry_policy
+async def fetch(session, url):
+    cached = response_cache.get(url) if response_cache else None
+    if cached and cached.fresh:
+        metrics.inc('cache_hits_total', client='parser_async')
+        return cached.body
+
+    async def request():
+        await rate_limiter.acquire(url)
+        async with sem.slot(is_overload):
+            return await get_page(session, url, cached)
+
+    try:
+        return await call_with_retries_async(retry_policy, request, host_failure_handler(rate_limiter, url, 'parser_async'))
+    except Exception as e:
+        print(f"❌ Не вдалося отримати {url}: {e}")
+        return None
+
+# Функція для виконання розбору HTML у пулі процесів (або в поточному потоці, якщо пул вимкнено).
+# Тривалість розбору записується в метрики за типом сторінки (listing, product, variation)
+async def run_extractor(extractor, *args):
+    with metrics.timer('parse_seconds', client='parser_async', page=extractor.__name__.replace('extract_', '')):
+        if parse_executor is None:
+            return extractor(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(parse_executor, extractor, *args)
 
 # Асинхронна функція для збору даних про продукти з категорій
 async def collect_product_data(categories, product_handler):
-    async with aiohttp.ClientSession(headers=HEADERS, timeout=ClientTimeout(total=None)) as session:
-        # Прогресбар для відстеження прогресу
-        for category in tqdm(categories, desc='Категорії', unit='категорія'):
-            try:
-                await collect_category(session, category, product_handler)
-            except Exception as e:
-                print(f"Помилка при зборі даних для категорії {category}: {e}")
-                await asyncio.sleep(requests_delay)
+    global parse_executor
+    metrics.start()
+    if parse_processes > 0:
+        parse_executor = ProcessPoolExecutor(max_workers=parse_processes)
+
+    # Пропускаємо категорії, які вже були пройдені до зупинки попереднього запуску
+    if crawl_state is not None:
+        categories = crawl_state.start(categories)
+
+    try:
+        async with aiohttp.ClientSession(headers=HEADERS, timeout=ClientTimeout(total=request_timeout or None)) as session:
+            # Прогресбар для відстеження прогресу
+            for category in tqdm(categories, desc='Категорії', unit='категорія'):
+                try:
+                    await collect_category(session, category, product_handler)
+                except Exception as e:
+                    print(f"Помилка при зборі даних для категорії {category}: {e}")
+                    await asyncio.sleep(requests_delay)
+
+                # Зберігаємо множину знайдених продуктів після кожної категорії
+                if seen_products is not None:
+                    seen_products.save()
+
+        # Обхід завершено, множина знайдених продуктів більше не потрібна
+        if seen_products is not None:
+            seen_products.clear()
+
+        # Запуск завершено: наступний почнеться з початку, навіть якщо деякі категорії не вдалося пройти
+        if crawl_state is not None:
+            crawl_state.finish()
+    finally:
+        print(f"⚙️ Паралельність: {sem.summary()}")
+        metrics.flush()
+        if proxy_pool is not None:
+            print(f"🌐 Проксі: {proxy_pool.summary()}")
+            await proxy_pool.close()
+        if parse_executor is not None:
+            parse_executor.shutdown()
+            parse_executor = None
+
+# Функція для формування URL сторінок категорії від сторінки next_page_url до останньої.
+# Повертає None, якщо номер сторінки не вдається визначити з параметра page
+def page_urls_range(next_page_url, last_page_number):
+    if not last_page_number:
+        return None
+
+    parsed = urlparse(next_page_url)
+    query = parse_qs(parsed.query)
+    try:
+        first_page = int(query['page'][0])
+    except (KeyError, ValueError):
+        return None
+
+    page_urls = []
+    for page in range(first_page, last_page_number + 1):
+        query['page'] = [str(page)]
+        page_urls.append(parsed._replace(query=urlencode(query, doseq=True)).geturl())
+    return page_urls
 
 # Функція для збору даних з категорії
 async def collect_category(session, category, product_handler):
     page_url = category + "?pageSize=128"
+    if crawl_state is not None:
+        page_url = crawl_state.page_url(category) or page_url
 
     last_page_number = None
     page_bar = None
+    completed = False
 
     batch = []
 
-    # Цикл для збору продуктів з категорії по сторінках
-    while True:
-        page_html = await fetch(session, page_url)
-        if page_html is None:
-            print(f"❌ Не вдалося отримати HTML для {page_url}")
-            break
-        soup = BeautifulSoup(page_html, 'html.parser')
-
-        # Знаходимо останню сторінку, якщо вона є
-        if not last_page_number:
-            last_page_element = soup.select_one(LAST_PAGE_SELECTOR)
-            last_page_number = int(last_page_element.get_text(strip=True))
-            page_bar = tqdm(total=last_page_number, desc='Сторінки', unit='стр.')
-        
-        # Оновлюємо прогресбар для сторінок
-        if page_bar:
-            page_bar.update(1)
-        
-        # Збираємо посилання на продукти на поточній сторінці
-        products = soup.select(PRODUCT_LINK_SELECTOR)
-
-        # Якщо продукти не знайдено, виходимо з циклу
-        if not products:
-            print(f"❌ Не знайдено продукти на сторінці {page_url}")
-            break
-
-        # Збираємо дані про кожен продукт
-        for product in tqdm(products, desc="Товари на сторінці", unit="прод"):
-            url = product.get('href')
-            if url:
-                full_url = "https://www.fruugo.co.uk" + url if url.startswith("/") else url
-                product_data = await collect_product_page(session, full_url, page_url)
-                if product_data:
+    # Передача батчу обробнику; після цього продукти батчу вважаються обробленими.
+    # Обробник може бути корутинною функцією, якщо передача батчу блокує (наприклад, у шардах)
+    async def flush(ready_batch):
+        result = product_handler(ready_batch)
+        if inspect.isawaitable(result):
+            await result
+        metrics.inc('products_total', len(ready_batch), client='parser_async')
+        if crawl_state is not None:
+            crawl_state.mark_done([product["url"] for product in ready_batch])
+        # Відбиток зберігається, коли продукт записано в батч: інкрементальний режим розраховує, що батчі
+        # будуть імпортовані, а імпортер видаляє відбитки продуктів, які імпортувати не вдалося
+        if fingerprints is not None:
+            fingerprints.save(ready_batch)
+
+    # Черга посилань на продукти: сторінки категорії її наповнюють, воркери розбирають
+    product_queue = asyncio.Queue(maxsize=product_workers * 2)
+    product_bar = tqdm(desc="Товари категорії", unit="прод")
+
+    # Воркер, який забирає посилання з черги та збирає дані про продукт
+    async def product_worker():
+        nonlocal batch
+        while True:
+            item = await product_queue.get()
+            if item is None:
+                product_queue.task_done()
+                break
+
+            full_url, parent_page_url = item
+            try:
+                product_data = await collect_product_page(session, full_url, parent_page_url)
+                if product_data is UNCHANGED:
+                    if crawl_state is not None:
+                        crawl_state.mark_done([full_url])
+                elif product_data:
                     batch.append(product_data)
 
                     # Якщо розмір батчу досягнув batch_size, обробляємо його
                     if len(batch) >= batch_size:
-                        product_handler(batch)
-                        batch = []
-
-        # Перевірка наявності кнопки "Наступна сторінка"
-        next_page = soup.select_one(NEXT_PAGE_SELECTOR)
-        if not next_page or 'disabled' in next_page.get('class', []):
-            print(f"❌ Наступна сторінка не знайдена або вона вимкнена.")
-            break
-        else:
-            next_page_url = next_page.get('href')
-            if next_page_url:
-                page_url = "https://www.fruugo.co.uk" + next_page_url if next_page_url.startswith("/") else next_page_url
-            else:
-                print("❌ URL наступної сторінки не знайдено.")
+                        ready_batch, batch = batch, []
+                        await flush(ready_batch)
+            except Exception as e:
+                print(f"❌ Помилка при зборі даних для продукту {full_url}: {e}")
+            finally:
+                product_bar.update(1)
+                product_bar.set_postfix(ліміт=sem.current, refresh=False)
+                metrics.set('concurrency_limit', sem.current, client='parser_async')
+                product_queue.task_done()
+
+    workers = [asyncio.create_task(product_worker()) for _ in range(product_workers)]
+
+    # Функція для передачі продуктів сторінки воркерам
+    async def enqueue_products(page_url, product_urls):
+        # Відкидаємо продукти, які вже зустрічались у цій або інших категоріях
+        if seen_products is not None:
+            product_urls = [full_url for full_url in product_urls if seen_products.add(full_url)]
+
+        # Зберігаємо продукти сторінки у стані обходу, відкидаючи вже відомі
+        if crawl_state is not None:
+            product_urls = crawl_state.add_products(category, page_url, product_urls)
+
+        # Передаємо посилання на продукти воркерам через чергу
+        for full_url in product_urls:
+            await product_queue.put((full_url, page_url))
+
+    # Функція для паралельного завантаження сторінок категорії (не більше page_workers одночасно).
+    # Повертає True, якщо всі сторінки вдалося завантажити
+    async def collect_pages(page_urls):
+        page_sem = asyncio.Semaphore(page_workers)
+        loaded = [False] * len(page_urls)
+        saved = 0
+
+        async def load_page(index, page_url):
+            nonlocal saved
+            async with page_sem:
+                page_html = await fetch(session, page_url)
+                if page_html is None:
+                    print(f"❌ Не вдалося отримати HTML для {page_url}")
+                    return False
+                listing = await run_extractor(extract_listing, page_html)
+
+            if page_bar:
+                page_bar.update(1)
+
+            if not listing["product_urls"]:
+                print(f"❌ Не знайдено продукти на сторінці {page_url}")
+            await enqueue_products(page_url, listing["product_urls"])
+
+            # Зберігаємо в стані обходу першу сторінку, перед якою всі сторінки вже завантажені
+            loaded[index] = True
+            while saved < len(page_urls) and loaded[saved]:
+                saved += 1
+            if crawl_state is not None and saved < len(page_urls):
+                crawl_state.set_page(category, page_urls[saved])
+            return True
+
+        # Помилка на одній сторінці не зупиняє решту: сторінка пропускається і залишається незавантаженою,
+        # тому категорія не позначається пройденою і наступний запуск продовжить з цієї сторінки
+        async def collect_page(index, page_url):
+            try:
+                return await load_page(index, page_url)
+            except Exception as e:
+                print(f"❌ Помилка при обробці сторінки {page_url}: {e}")
+                return False
+
+        # Якщо завантаження сторінок перервано (скасування або неочікувана помилка), решту задач скасовуємо
+        # до того, як воркерам буде надіслано сигнал завершення, інакше вони продовжили б наповнювати чергу
+        tasks = [asyncio.create_task(collect_page(index, page_url)) for index, page_url in enumerate(page_urls)]
+        try:
+            results = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return all(results)
+
+    try:
+        # Спочатку повертаємо в чергу продукти, які не встигли обробити до зупинки попереднього запуску
+        if crawl_state is not None:
+            for item in crawl_state.queued_products(category):
+                await product_queue.put(item)
+
+        # Цикл для збору продуктів з категорії по сторінках
+        while True:
+            page_html = await fetch(session, page_url)
+            if page_html is None:
+                print(f"❌ Не вдалося отримати HTML для {page_url}")
+                break
+            listing = await run_extractor(extract_listing, page_html)
+
+            # Знаходимо останню сторінку, якщо вона є
+            if not last_page_number and listing["last_page_number"]:
+                last_page_number = listing["last_page_number"]
+                page_bar = tqdm(total=last_page_number, desc='Сторінки', unit='стр.')
+            
+            # Оновлюємо прогресбар для сторінок
+            if page_bar:
+                page_bar.update(1)
+
+            # Якщо продукти не знайдено, виходимо з циклу
+            if not listing["product_urls"]:
+                print(f"❌ Не знайдено продукти на сторінці {page_url}")
+                completed = True
+                break
+
+            await enqueue_products(page_url, listing["product_urls"])
+
+            # Перехід на наступну сторінку
+            if not listing["next_page_url"]:
+                print(f"❌ Наступна сторінка не знайдена або вона вимкнена.")
+                completed = True
                 break
 
-        await asyncio.sleep(requests_delay)
+            # Якщо відомий номер останньої сторінки, решту сторінок завантажуємо паралельно.
+            # Інакше продовжуємо переходити за посиланням "Наступна сторінка"
+            page_urls = page_urls_range(listing["next_page_url"], listing["last_page_number"]) if parallel_pages else None
+            if page_urls:
+                completed = await collect_pages(page_urls)
+                break
+
+            page_url = listing["next_page_url"]
+
+            if crawl_state is not None:
+                crawl_state.set_page(category, page_url)
+    finally:
+        # Сигналізуємо воркерам про завершення та чекаємо, поки вони доопрацюють чергу
+        for _ in workers:
+            await product_queue.put(None)
+        await asyncio.gather(*workers)
+        product_bar.close()
 
     # Обробка залишків продуктів у батчі
     if len(batch) > 0:
-        product_handler(batch)
+        await flush(batch)
+
+    # Категорія пройдена повністю. Якщо сторінку не вдалося завантажити, категорія продовжиться в наступному запуску
+    if crawl_state is not None and completed:
+        crawl_state.finish_category(category)
         
 
 # Функція для збору даних про продукт за URL
@@ -172,190 +459,106 @@ async def collect_product_page(session, url, parent_page_url):
     html = await fetch(session, url)
     if html is None:
         return None
-    soup = BeautifulSoup(html, 'html.parser')
+    page = await run_extractor(extract_product, html, url)
 
-    # Отримання заголовку
-    title = soup.select_one(TITLE_SELECTOR)
-    if title:
-        title = title.get_text(strip=True)
-    else:
-        print(f"❌ Не вдалося знайти назву продукту на сторінці {url}")
+    for warning in page["warnings"]:
+        print(f"❌ {warning}")
+    if page["error"]:
+        print(f"❌ {page['error']}")
         return None
 
-    # Функція для очищення та перетворення тексту ціни у число
-    def extract_price(text):
-        if not text:
-            return None
-        cleaned = re.sub(r"[^\d.]", "", text)
-        try:
-            return float(cleaned)
-        except ValueError:
-            return None
-
-    # Отримання цін
-    regular_price = soup.select_one(REGULAR_PRICE_SELECTOR)
-    if regular_price:
-        regular_price = extract_price(regular_price.get_text(strip=True))
+    # Якщо продукт не змінився з попереднього запуску, варіації не завантажуємо
+    fingerprint = product_fingerprint(page)
+    if fingerprints is not None and fingerprints.unchanged(url, fingerprint):
+        metrics.inc('products_unchanged_total', client='parser_async')
+        return UNCHANGED
 
-        sale_price = soup.select_one(SALE_PRICE_SELECTOR)
-        if sale_price:
-            sale_price = extract_price(sale_price.get_text(strip=True))
-        else:
-            sale_price = None
-    else:
-        sale_price = None
+    variation_urls = [re.sub(r'(p-\d+)', rf'\1-{id}', url) for id in page["variation_ids"]]
 
-        regular_price = soup.select_one(PRICE_SELECTOR)
-        if regular_price:
-            regular_price = extract_price(regular_price.get_text(strip=True))
-        else:
-            print(f"❌ Не вдалося знайти ціну продукту на сторінці {url}")
-            return None
+    # Паралельне отримання варіацій (кількість одночасних запитів обмежує глобальний адаптивний ліміт)
+    results = await asyncio.gather(
+        *(get_variation_once(session, variation_url) for variation_url in variation_urls),
+        return_exceptions=True
+    )
 
-    # Отримання опису
-    description = soup.select_one(DESCRIPTION_SELECTOR)
-    if description:
-        description = str(description)
-    else:
-        print(f"❌ Не вдалося знайти опис продукту на сторінці {url}")
-        return None
-
-    # Отримання категорії
-    categories = soup.select(CATEGORIES_SELECTOR)
-    if categories:
-        categories = " > ".join([cat.get_text(strip=True) for cat in categories])
-    else:
-        print(f"❌ Не вдалося знайти категорії продукту на сторінці {url}")
-        categories = None
-
-    # Отримання бренду
-    brand = soup.select_one(BRAND_SELECTOR)
-    if brand:
-        brand = brand.get_text(strip=True)
-    else:
-        brand = None
-
-    # Функція для отримання варіації за URL
-    async def get_variation_by_url(variation_url):
-        match = re.search(r'/p-(\d+)-(\d+)', variation_url)
-        if match:
-            product_id, variant_id = match.groups()
-            sku = f"SKU-{product_id}-{variant_id}"
-        else:
-            print(f"❌ Не вдалося отримати ID продукту з URL: {variation_url}")
-            return None
-
-        html = await variation_fetch(session, variation_url)
-        if html is None:
-            return None
-        soup = BeautifulSoup(html, 'html.parser')
-
-        # Отримання розміру
-        size = soup.select(SIZE_SELECTOR)
-        if size:
-            size = size[0].get_text(strip=True)
-        else:
-            size = None
-
-        # Отримання кольору
-        color = soup.select(COLOR_SELECTOR)
-        if color:
-            color = color[0].get_text(strip=True)
-        else:
-            color = None
-
-        # Костиль для обміну розміру та кольору - на сайті коли вони обидва присутні, то розмір і колір переплутані
-        if color and size:
-            new_color = size
-            new_size = color
-            size = new_size
-            color = new_color
-
-        # Отримання наявності
-        availability = soup.select_one(AVAILABILITY_SELECTOR)
-        if availability:
-            availability_text = availability.get_text(strip=True)
-            availability = availability_text == "In stock"
-        else:
-            availability = None
-
-        # Отримання зображень
-        images = soup.select(IMAGES_SELECTOR)
-        if images:
-            images = [img.get('data-image') for img in images]
-        else:
-            image = soup.select_one(IMAGE_SELECTOR)
-            if image:
-                images = [image.get('src')]
-            else:
-                images = []
-
-        return {
-            "sku": sku,
-            "size": size,
-            "color": color,
-            "availability": availability,
-            "images": images
-        }
-    
-    # Отримання id варіацій
-    variations_options = soup.select(VARIATION_SELECTOR)
     variations = []
-    all_variation_ids = []
     images = []
-    for variation_option in variations_options:
-        value = variation_option.get('value', '')
-
-        match = re.search(r'\[([^\]]+)\]', value)
-        if match:
-            ids = match.group(1).split(', ')
-        
-        for id in ids:
-            if id in all_variation_ids:
-                continue
-
-            all_variation_ids.append(id)
-            variation_url = re.sub(r'(p-\d+)', rf'\1-{id}', url)
-
-            try:
-                variation_data = await get_variation_by_url(variation_url)
-            except Exception as e:
-                print(f"❌ Помилка при отриманні варіації з {variation_url}: {e}")
-                continue
-            if variation_data:
-                variations.append(variation_data)
-                if variation_data.get("images"):
-                    for img in variation_data["images"]:
-                        if img not in images:
-                            images.append(img)
-
+    for variation_url, variation_data in zip(variation_urls, results):
+        if isinstance(variation_data, Exception):
+            print(f"❌ Помилка при отриманні варіації з {variation_url}: {variation_data}")
+            variation_data = None
+        # Продукт без частини варіацій не передається обробнику: відбиток покриває лише основну сторінку,
+        # тому збережений відбиток неповного продукту назавжди приховав би втрачені варіації.
+        # Продукт залишається незавершеним у стані обходу і збирається повторно в наступному запуску
+        if not variation_data:
+            print(f"❌ Не всі варіації отримано, продукт {url} буде зібрано повторно")
+            metrics.inc('products_incomplete_total', client='parser_async')
+            return None
+        variations.append(variation_data)
+        if variation_data.get("images"):
+            for img in variation_data["images"]:
+                if img not in images:
+                    images.append(img)
 
     product_data = {
-        "title": title,
+        "title": page["title"],
         "url": url,
         "parent_page_url": parent_page_url,
-        "regular_price": regular_price,
-        "sale_price": sale_price,
-        "description": description,
-        "categories": categories,
+        "regular_price": page["regular_price"],
+        "sale_price": page["sale_price"],
+        "description": page["description"],
+        "categories": page["categories"],
         "images": images,
-        "brand": brand,
+        "brand": page["brand"],
         "variations": variations,
+        "fingerprint": fingerprint,
     }
     return product_data
 
+# Функція для отримання варіації за URL
+async def get_variation_by_url(session, variation_url):
+    match = re.search(r'/p-(\d+)-(\d+)', variation_url)
+    if match:
+        product_id, variant_id = match.groups()
+        sku = f"SKU-{product_id}-{variant_id}"
+    else:
+        print(f"❌ Не вдалося отримати ID продукту з URL: {variation_url}")
+        return None
+
+    html = await fetch(session, variation_url)
+    if html is None:
+        return None
+    variation = await run_extractor(extract_variation, html)
+
+    return {"sku": sku, **variation}
+
+# Задачі завантаження варіацій, які виконуються зараз (URL -> задача)
+variation_tasks = {}
+
+# Функція для отримання варіації з об'єднанням однакових запитів: якщо ця ж варіація
+# вже завантажується іншою задачею, чекаємо на її результат замість повторного запиту
+async def get_variation_once(session, variation_url):
+    task = variation_tasks.get(variation_url)
+    if task is None:
+        task = asyncio.ensure_future(get_variation_by_url(session, variation_url))
+        variation_tasks[variation_url] = task
+        task.add_done_callback(lambda _: variation_tasks.pop(variation_url, None))
+    return await asyncio.shield(task)
+
 # Приклад використання функції
 if __name__ == "__main__":
     with open('data/categories.json', 'r', encoding='utf-8') as f:
         categories = json.load(f)
 
-    counter = 0
-
-    def test_handler(data):
-        global counter
-        file_path = f"data/batches/batch_{counter}.json"
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-        counter += 1
-
-    asyncio.run(collect_product_data(categories, test_handler))
\ No newline at end of file
+    # Продукти пишуться у стиснуті NDJSON-файли з ротацією замість окремого JSON-файлу на кожен батч
+    writer = NdjsonWriter(
+        'data/batches',
+        compression=output_compression,
+        max_products=output_max_products,
+        max_bytes=output_max_mb * 1024 * 1024,
+        fsync_every=output_fsync_every,
+    )
+    try:
+        asyncio.run(collect_product_data(categories, writer.write_batch))
+    finally:
+        writer.close()
\ No newline at end of file
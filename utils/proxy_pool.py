@@ -0,0 +1,121 @@
+import time
+import random
+import aiohttp
+
+# Статуси відповіді, які означають, що сайт заблокував проксі.
+# 429 не є блокуванням проксі: сайт просить зменшити частоту, це обробляють обмежувач частоти та політика повторів
+BAN_STATUSES = {403}
+
+# Фрагменти сторінки з капчею або перевіркою на бота
+BAN_MARKERS = (b'g-recaptcha', b'h-captcha', b'captcha-delivery', b'cf-challenge')
+
+# Виняток для відповіді, яка виглядає як блокування проксі
+class ProxyBannedError(Exception):
+    pass
+
+# Стан одного проксі: середня затримка, кількість помилок та час, до якого він відсторонений
+class ProxyState:
+    def __init__(self, url):
+        self.url = url
+        self.latency = None
+        self.requests = 0
+        self.errors = 0
+        self.failures_in_row = 0
+        self.bans_in_row = 0
+        self.ejected_until = 0
+        self.session = None
+
+    # Оцінка проксі: чим менша, тим краще. Нові проксі без жодного запиту отримують найкращу оцінку,
+    # щоб їх спробували якомога раніше. Проксі, у якого були запити, але жодного успішного
+    # (затримка не виміряна), оцінюється за типовою затримкою пулу default_latency з урахуванням помилок
+    def score(self, default_latency=1.0):
+        if self.latency is None and self.requests == 0:
+            return 0
+        error_rate = (self.errors + 1) / (self.requests + 2)
+        latency = self.latency if self.latency is not None else default_latency
+        return latency * (1 + 4 * error_rate)
+
+# Пул проксі з урахуванням їхнього стану та окремим пулом з'єднань для кожного проксі
+class ProxyPool:
+    def __init__(self, proxies, ban_seconds=60, max_ban_seconds=900, max_failures=3, connections_per_proxy=10, **session_kwargs):
+        self.proxies = [ProxyState(url) for url in proxies]
+        self.ban_seconds = ban_seconds
+        self.max_ban_seconds = max_ban_seconds
+        self.max_failures = max_failures
+        self.connections_per_proxy = connections_per_proxy
+        self.session_kwargs = session_kwargs
+
+    # Вибір проксі: з двох випадкових доступних беремо той, що має кращу оцінку.
+    # Якщо всі проксі відсторонені, повертаємо той, що звільниться найраніше
+    def choose(self):
+        now = time.monotonic()
+        available = [proxy for proxy in self.proxies if proxy.ejected_until <= now]
+        if not available:
+            return min(self.proxies, key=lambda proxy: proxy.ejected_until)
+        if len(available) == 1:
+            return available[0]
+        first, second = random.sample(available, 2)
+        default_latency = self.median_latency()
+        return first if first.score(default_latency) <= second.score(default_latency) else second
+
+    # Медіанна затримка проксі, для яких вона виміряна (1 с, якщо таких ще немає)
+    def median_latency(self):
+        latencies = sorted(proxy.latency for proxy in self.proxies if proxy.latency is not None)
+        if not latencies:
+            return 1.0
+        return latencies[len(latencies) // 2]
+
+    # Сесія з власним пулом з'єднань для проксі (створюється при першому використанні)
+    def session(self, proxy):
+        if proxy.session is None or proxy.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.connections_per_proxy)
+            proxy.session = aiohttp.ClientSession(connector=connector, **self.session_kwargs)
+        return proxy.session
+
+    # Відсторонення проксі на вказану кількість секунд
+    def eject(self, proxy, seconds):
+        proxy.ejected_until = time.monotonic() + min(seconds, self.max_ban_seconds)
+
+    def report_success(self, proxy, latency):
+        proxy.requests += 1
+        proxy.failures_in_row = 0
+        proxy.bans_in_row = 0
+        proxy.latency = latency if proxy.latency is None else proxy.latency * 0.7 + latency * 0.3
+
+    # Помилка з'єднання або відповідь 5xx: після max_failures помилок поспіль проксі відсторонюється,
+    # і кожна наступна помилка подвоює час відсторонення
+    def report_failure(self, proxy):
+        proxy.requests += 1
+        proxy.errors += 1
+        proxy.failures_in_row += 1
+        if proxy.failures_in_row >= self.max_failures:
+            self.eject(proxy, self.ban_seconds * 2 ** (proxy.failures_in_row - self.max_failures))
+
+    # Блокування з боку сайту: проксі відсторонюється одразу, час росте з кожним блокуванням поспіль
+    def report_ban(self, proxy):
+        proxy.requests += 1
+        proxy.errors += 1
+        proxy.bans_in_row += 1
+        self.eject(proxy, self.ban_seconds * 2 ** (proxy.bans_in_row - 1))
+
+    # Оновлення стану проксі за отриманою відповіддю. 429 не змінює стан проксі
+    def check_response(self, proxy, status, body, latency):
+        if status in BAN_STATUSES or any(marker in body for marker in BAN_MARKERS):
+            self.report_ban(proxy)
+            raise ProxyBannedError(f"Проксі {proxy.url} заблоковано (статус {status})")
+        if status >= 500:
+            self.report_failure(proxy)
+        elif status != 429:
+            self.report_success(proxy, latency)
+
+    # Короткий звіт про стан пулу
+    def summary(self):
+        now = time.monotonic()
+        active = sum(1 for proxy in self.proxies if proxy.ejected_until <= now)
+        return f"активних {active} з {len(self.proxies)}"
+
+    async def close(self):
+        for proxy in self.proxies:
+            if proxy.session is not None:
+                await proxy.session.close()
+                proxy.session = None
@@ -0,0 +1,128 @@
+import time
+import asyncio
+import threading
+from urllib.parse import urlparse
+
+# Обмежувач частоти запитів за алгоритмом "token bucket".
+# Токени поповнюються зі швидкістю rate за секунду, але їх не може бути більше ніж burst.
+# Кожен запит забирає один токен; якщо токенів немає, запит резервує наступний і чекає на нього.
+# Очікування відбувається поза семафором одночасних запитів, тому слот не простоює
+class TokenBucket:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    # Резервує токен та повертає, скільки секунд потрібно почекати до його появи (і до кінця паузи)
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            pause = max(0.0, self.paused_until - now)
+            if self.rate <= 0:
+                return pause
+
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return pause
+            return max(pause, -self.tokens / self.rate)
+
+    # Пауза для всіх запитів через цей обмежувач (наприклад, на Retry-After з відповіді 429)
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    # Асинхронне очікування токена
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # Синхронне очікування токена
+    def acquire_sync(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+# Набір обмежувачів з окремим token bucket для кожного хоста
+class HostRateLimiter:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    # Отримання (або створення) обмежувача для хоста з URL
+    def bucket(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self.buckets[host] = bucket
+        return bucket
+
+    async def acquire(self, url):
+        await self.bucket(url).acquire()
+
+    def acquire_sync(self, url):
+        self.bucket(url).acquire_sync()
+
+    # Пауза для хоста з URL: сайт попросив зменшити частоту запитів
+    def pause(self, url, seconds):
+        self.bucket(url).pause(seconds)
+
+# Token bucket у спільній пам'яті для кількох процесів: стан (кількість токенів, час оновлення та кінець паузи)
+# зберігається в multiprocessing.Array, доступ захищений multiprocessing.Lock.
+# time.monotonic в Linux спільний для всіх процесів системи
+class SharedTokenBucket(TokenBucket):
+    def __init__(self, rate, burst, state, lock):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.state = state
+        self.lock = lock
+
+    # Створення спільного стану в батьківському процесі (передається дочірнім процесам)
+    @staticmethod
+    def create_state(context, burst):
+        return context.Array('d', [max(burst, 1), time.monotonic(), 0], lock=False), context.Lock()
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            pause = max(0.0, self.state[2] - now)
+            if self.rate <= 0:
+                return pause
+
+            tokens = min(self.capacity, self.state[0] + (now - self.state[1]) * self.rate)
+            self.state[1] = now
+            tokens -= 1
+            self.state[0] = tokens
+            if tokens >= 0:
+                return pause
+            return max(pause, -tokens / self.rate)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.state[2] = max(self.state[2], time.monotonic() + seconds)
+
+# Обмежувач з одним спільним бюджетом запитів на всі процеси (інтерфейс як у HostRateLimiter)
+class SharedRateLimiter:
+    def __init__(self, rate, burst, state, lock):
+        self.shared_bucket = SharedTokenBucket(rate, burst, state, lock)
+
+    def bucket(self, url):
+        return self.shared_bucket
+
+    async def acquire(self, url):
+        await self.shared_bucket.acquire()
+
+    def acquire_sync(self, url):
+        self.shared_bucket.acquire_sync()
+
+    def pause(self, url, seconds):
+        self.shared_bucket.pause(seconds)
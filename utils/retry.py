@@ -0,0 +1,196 @@
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from utils.metrics import metrics
+
+# Статуси, після яких запит має сенс повторити (тимчасові помилки сервера та перевантаження).
+# Інші статуси (400, 401, 403, 404 тощо) вважаються остаточними - повтор дасть той самий результат
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# Статуси, з якими сервер разом з Retry-After просить лише зменшити швидкість запитів
+THROTTLE_STATUSES = {429, 503}
+
+# Функція для розбору заголовка Retry-After (кількість секунд або HTTP-дата). Повертає секунди або None
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# Функція для отримання статусу та заголовків відповіді з винятку aiohttp або requests
+def response_details(exception):
+    status = getattr(exception, 'status', None)
+    headers = getattr(exception, 'headers', None)
+    response = getattr(exception, 'response', None)
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None)
+        headers = getattr(response, 'headers', None)
+    return status, headers
+
+# Помилкова відповідь сервера для повторів: статус і заголовки читає response_details,
+# як і з винятків aiohttp та requests
+class ResponseError(Exception):
+    def __init__(self, status, headers=None, message=None):
+        super().__init__(message or f"HTTP {status}")
+        self.status = status
+        self.headers = headers
+
+# Функція для визначення паузи для хоста після відповіді 429: Retry-After, а без нього - затримка повтору delay.
+# Для інших помилок повертає None
+def throttle_pause(exception, delay=None):
+    status, headers = response_details(exception)
+    if status != 429:
+        return None
+    retry_after = parse_retry_after(headers.get('Retry-After')) if headers else None
+    return retry_after if retry_after is not None else delay
+
+# Політика повторних запитів: експоненційна затримка з повним джитером, Retry-After,
+# поділ статусів на тимчасові та остаточні і бюджет повторів. Бюджет - це запас токенів
+# (не більше budget), кожен повтор забирає токен, а поповнюється він з часом (refill_rate токенів
+# за секунду) та кожним успішним запитом (budget_ratio токена). Коли сервер лежить, повтори швидко
+# вичерпують бюджет і не множать навантаження на нього, але після паузи повтори знову можливі.
+# Відповіді 429/503 з Retry-After бюджет не витрачають: сервер лише просить зачекати
+class RetryPolicy:
+    def __init__(self, max_attempts=3, base_delay=1.0, max_delay=60.0, budget=10, budget_ratio=0.2, refill_rate=0.5, max_throttle_wait=600.0):
+        self.max_attempts = max(max_attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.budget_ratio = budget_ratio
+        self.refill_rate = refill_rate
+        self.max_throttle_wait = max_throttle_wait
+        self.tokens = float(budget)
+        self.refilled_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Поповнення бюджету за час, що минув з попереднього поповнення (викликається під lock)
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.budget, self.tokens + (now - self.refilled_at) * self.refill_rate)
+        self.refilled_at = now
+
+    # Успішний запит поповнює бюджет повторів
+    def record_success(self):
+        with self.lock:
+            self.refill()
+            self.tokens = min(self.budget, self.tokens + self.budget_ratio)
+
+    # Пауза, про яку сервер просить відповіддю 429/503 з Retry-After. Така пауза не витрачає ні бюджет,
+    # ні спроби запиту, доки загальне очікування запиту (waited) не перевищить max_throttle_wait.
+    # Повертає секунди або None, якщо це не прохання зачекати
+    def throttle_delay(self, waited=0.0, exception=None, status=None, headers=None):
+        if exception is not None and status is None:
+            status, headers = response_details(exception)
+        if status not in THROTTLE_STATUSES or not headers:
+            return None
+
+        retry_after = parse_retry_after(headers.get('Retry-After'))
+        if retry_after is None or waited + retry_after > self.max_throttle_wait:
+            return None
+        # Невеликий джитер, щоб запити, які чекали разом, не повертались одночасно
+        return retry_after + random.uniform(0, min(self.base_delay, 1.0))
+
+    # Затримка перед наступною спробою. attempt - номер невдалої спроби (з 0).
+    # Статус і заголовки беруться з винятку або передаються явно. Повертає None, якщо повторювати не потрібно
+    def retry_delay(self, attempt, exception=None, status=None, headers=None):
+        if exception is not None and status is None:
+            status, headers = response_details(exception)
+
+        if attempt + 1 >= self.max_attempts:
+            return None
+        if status is not None and status not in RETRYABLE_STATUSES:
+            return None
+
+        with self.lock:
+            self.refill()
+            if self.tokens < 1:
+                return None
+            self.tokens -= 1
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = parse_retry_after(headers.get('Retry-After')) if headers else None
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    # Рішення після невдалої спроби: (True, секунди) - сервер просить зачекати (429/503 з Retry-After),
+    # спроба та бюджет при цьому не витрачаються; (False, секунди) - повтор після затримки;
+    # None - повторювати не потрібно. waited - скільки запит вже чекав на прохання сервера
+    def next_step(self, attempt, waited, exception):
+        wait = self.throttle_delay(waited, exception)
+        if wait is not None:
+            return True, wait
+        delay = self.retry_delay(attempt, exception)
+        return (False, delay) if delay is not None else None
+
+# Функція для виконання запиту з повторами згідно з policy. request() робить одну спробу: повертає результат
+# або кидає виняток (помилкову відповідь - як ResponseError). on_failure(exception, attempt, throttled, delay)
+# викликається після кожної невдалої спроби (delay None - повторів більше не буде). Після останньої спроби
+# виняток передається викликачу
+def call_with_retries(policy, request, on_failure=None):
+    attempt = 0
+    waited = 0
+    while True:
+        try:
+            result = request()
+        except Exception as e:
+            step = policy.next_step(attempt, waited, e)
+            throttled, delay = step or (False, None)
+            if on_failure:
+                on_failure(e, attempt, throttled, delay)
+            if step is None:
+                raise
+            if throttled:
+                waited += delay
+            else:
+                attempt += 1
+            time.sleep(delay)
+            continue
+        policy.record_success()
+        return result
+
+# Асинхронний варіант call_with_retries: request - корутинна функція
+async def call_with_retries_async(policy, request, on_failure=None):
+    attempt = 0
+    waited = 0
+    while True:
+        try:
+            result = await request()
+        except Exception as e:
+            step = policy.next_step(attempt, waited, e)
+            throttled, delay = step or (False, None)
+            if on_failure:
+                on_failure(e, attempt, throttled, delay)
+            if step is None:
+                raise
+            if throttled:
+                waited += delay
+            else:
+                attempt += 1
+            await asyncio.sleep(delay)
+            continue
+        policy.record_success()
+        return result
+
+# Функція для створення on_failure парсерів: пауза хоста в rate_limiter, коли сервер просить зменшити
+# частоту запитів (429 або Retry-After), та лічильники повторів у метриках
+def host_failure_handler(rate_limiter, url, client):
+    def on_failure(exception, attempt, throttled, delay):
+        pause = delay if throttled else throttle_pause(exception, delay)
+        if pause:
+            rate_limiter.pause(url, pause)
+        if delay is None:
+            metrics.inc('fetch_failures_total', client=client)
+        elif throttled:
+            metrics.inc('throttled_total', client=client)
+        else:
+            metrics.inc('retries_total', client=client)
+    return on_failure
@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import queue
+import argparse
+import configparser
+import multiprocessing
+from tqdm import tqdm
+from utils.ndjson import NdjsonWriter
+from utils.rate_limiter import SharedRateLimiter, SharedTokenBucket
+
+# Обхід категорій кількома процесами (шардами). Кожен процес має власний цикл подій та пул з'єднань
+# utils.parser_async, а спільними для всіх є бюджет запитів (token bucket у спільній пам'яті)
+# та множина знайдених продуктів (SQLite). Батчі з усіх процесів пише один NdjsonWriter батьківського процесу;
+# шард позначає продукти батчу обробленими лише після підтвердження запису від батьківського процесу.
+# Запуск з кореня репозиторію: python -m utils.shard_crawler --shards 4
+
+# Завантажуємо конфігурацію
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+shards = config.getint('PARSER', 'shards', fallback=0)
+requests_delay = config.getint('PARSER', 'requests_delay', fallback=1)
+requests_per_second = config.getfloat('PARSER', 'requests_per_second', fallback=1 / requests_delay if requests_delay > 0 else 0)
+requests_burst = config.getint('PARSER', 'requests_burst', fallback=1)
+dedup_products = config.getboolean('PARSER', 'dedup_products', fallback=True)
+persist_seen_products = config.getboolean('PARSER', 'persist_seen_products', fallback=False)
+output_compression = config.get('PARSER', 'output_compression', fallback='gzip')
+output_max_products = config.getint('PARSER', 'output_max_products', fallback=1000)
+output_max_mb = config.getint('PARSER', 'output_max_mb', fallback=256)
+output_fsync_every = config.getint('PARSER', 'output_fsync_every', fallback=100)
+
+SHARDS_DIR = 'data/shards'
+# Інтервал, з яким шард перевіряє, чи живий батьківський процес, поки чекає на чергу або підтвердження
+PARENT_CHECK_SECONDS = 5
+SEEN_PRODUCTS_PATH = os.path.join(SHARDS_DIR, 'seen_products.sqlite')
+
+# Функція для розподілу категорій між шардами. Розподіл детермінований,
+# тому після перезапуску з тією ж кількістю шардів кожен продовжує зі свого стану обходу
+def split_categories(categories, count):
+    return [categories[index::count] for index in range(count)]
+
+# Функція для передачі елемента в чергу з дочірнього процесу. Чекає на місце в черзі частинами по
+# PARENT_CHECK_SECONDS і припиняє очікування, якщо батьківський процес завершився
+def put_to_parent(output, item):
+    while True:
+        try:
+            output.put(item, timeout=PARENT_CHECK_SECONDS)
+            return
+        except queue.Full:
+            if not multiprocessing.parent_process().is_alive():
+                raise RuntimeError("батьківський процес завершився")
+
+# Функція для очікування підтвердження запису батчу від батьківського процесу
+def wait_for_ack(ack):
+    while True:
+        try:
+            return ack.get(timeout=PARENT_CHECK_SECONDS)
+        except queue.Empty:
+            if not multiprocessing.parent_process().is_alive():
+                raise RuntimeError("батьківський процес завершився")
+
+# Функція, яка виконується в дочірньому процесі: обхід своєї частини категорій
+def run_shard(index, categories, rate_state, rate_lock, output, ack):
+    import asyncio
+    from utils import metrics as metrics_module
+    from utils import parser_async
+    from utils.crawl_state import CrawlState
+    from utils.dedup import SharedSeenProducts
+
+    # Спільний для всіх процесів бюджет запитів замість власного обмежувача процесу
+    parser_async.rate_limiter = SharedRateLimiter(requests_per_second, requests_burst, rate_state, rate_lock)
+
+    if parser_async.dedup_products:
+        parser_async.seen_products = SharedSeenProducts(SEEN_PRODUCTS_PATH)
+
+    # Кожен шард продовжує обхід зі свого файлу стану
+    if parser_async.crawl_state is not None:
+        parser_async.crawl_state.close()
+        parser_async.crawl_state = CrawlState(os.path.join(SHARDS_DIR, f'crawl_state_{index}.sqlite'), parser_async.resume_max_age_hours * 3600)
+
+    # Метрики кожного шарду пишуться в окремі файли, HTTP-сервер метрик у шардах не запускається
+    for name in ('json_path', 'prometheus_path'):
+        path = getattr(metrics_module, name)
+        if path:
+            root, ext = os.path.splitext(path)
+            setattr(metrics_module, name, f'{root}_shard{index}{ext}')
+    metrics_module.http_port = 0
+
+    # Батч передається батьківському процесу, і шард чекає, поки той його запише. Якщо запис не вдався,
+    # виняток не дає позначити продукти обробленими, і вони залишаються в стані обходу для наступного запуску.
+    # Блокуючі виклики черг виконуються в потоці, щоб цикл подій шарду тим часом продовжував запити.
+    # Батчі передаються по одному, бо підтвердження приходять у порядку надсилання
+    send_lock = None
+
+    def put_and_wait(batch):
+        put_to_parent(output, (index, batch))
+        if not wait_for_ack(ack):
+            raise RuntimeError("батьківський процес не записав батч")
+
+    async def send_batch(batch):
+        nonlocal send_lock
+        send_lock = send_lock or asyncio.Lock()
+        async with send_lock:
+            await asyncio.get_running_loop().run_in_executor(None, put_and_wait, batch)
+
+    try:
+        asyncio.run(parser_async.collect_product_data(categories, send_batch))
+    finally:
+        put_to_parent(output, (index, None))
+
+# Функція для запуску обходу категорій у count процесах. Батчі передаються в product_handler
+# батьківського процесу. Повертає кількість шардів, які завершились з помилкою
+def collect_product_data(categories, product_handler, count=None):
+    count = count or shards or os.cpu_count() or 1
+    count = max(1, min(count, len(categories)))
+    os.makedirs(SHARDS_DIR, exist_ok=True)
+
+    # Без збереження множини продуктів між запусками кожен запуск починає дедуплікацію з нуля
+    if not persist_seen_products:
+        remove_seen_products()
+
+    context = multiprocessing.get_context('spawn')
+    rate_state, rate_lock = SharedTokenBucket.create_state(context, requests_burst)
+    output = context.Queue(maxsize=count * 4)
+    acks = [context.Queue() for _ in range(count)]
+
+    # Прогресбари шардів вимкнені, загальний прогрес показує батьківський процес
+    os.environ['TQDM_DISABLE'] = '1'
+    processes = []
+    for index, part in enumerate(split_categories(categories, count)):
+        process = context.Process(target=run_shard, args=(index, part, rate_state, rate_lock, output, acks[index]), name=f'shard-{index}')
+        process.start()
+        processes.append(process)
+    del os.environ['TQDM_DISABLE']
+
+    print(f"⚙️ Шардів: {count}, категорій: {len(categories)}")
+    running = set(range(count))
+    progress = tqdm(desc='Продукти', unit='продукт', disable=False)
+    try:
+        while running:
+            try:
+                index, batch = output.get(timeout=1)
+            except queue.Empty:
+                # Процес міг завершитися аварійно, не надіславши сигнал завершення
+                for index in list(running):
+                    if not processes[index].is_alive() and output.empty():
+                        running.discard(index)
+                continue
+
+            if batch is None:
+                running.discard(index)
+                continue
+            try:
+                product_handler(batch)
+            except BaseException:
+                acks[index].put(False)
+                raise
+            acks[index].put(True)
+            progress.update(len(batch))
+    except BaseException:
+        # Батчі більше ніхто не читає: зупиняємо шарди, інакше вони чекали б на чергу без кінця
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        progress.close()
+        for process in processes:
+            process.join()
+
+    failed = [process.name for process in processes if process.exitcode != 0]
+    if failed:
+        print(f"❌ Шарди завершились з помилкою: {', '.join(failed)}")
+    elif dedup_products:
+        # Обхід завершено, спільна множина знайдених продуктів більше не потрібна
+        remove_seen_products()
+    return len(failed)
+
+# Функція для видалення спільної множини продуктів разом з файлами WAL
+def remove_seen_products():
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            os.remove(SEEN_PRODUCTS_PATH + suffix)
+        except FileNotFoundError:
+            pass
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обхід категорій кількома процесами")
+    parser.add_argument('--shards', type=int, default=0, help="кількість процесів (0 - з config.ini або кількість ядер)")
+    args = parser.parse_args()
+
+    with open('data/categories.json', 'r', encoding='utf-8') as f:
+        categories = json.load(f)
+
+    writer = NdjsonWriter(
+        'data/batches',
+        compression=output_compression,
+        max_products=output_max_products,
+        max_bytes=output_max_mb * 1024 * 1024,
+        fsync_every=output_fsync_every,
+    )
+    try:
+        failed = collect_product_data(categories, writer.write_batch, args.shards)
+    finally:
+        writer.close()
+    sys.exit(1 if failed else 0)
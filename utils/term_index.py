@@ -0,0 +1,84 @@
+import os
+import json
+import html
+import threading
+
+# Функція для нормалізації назви терміну: WooCommerce повертає назви з HTML-сутностями
+# і не дозволяє двох термінів з назвами, що відрізняються лише регістром
+def normalize_name(name):
+    return html.unescape(str(name)).strip().lower()
+
+# Індекс термінів атрибутів WooCommerce (pa_size, pa_color): назва -> ID для кожного атрибуту.
+# Завантажується один раз на процес і доповнюється створеними термінами. Якщо вказано path,
+# індекс зберігається у JSON між запусками і перевіряється при старті за кількістю термінів та ID найновішого
+class TermIndex:
+    def __init__(self, path=None, shop_url=None):
+        self.path = path
+        self.shop_url = shop_url
+        self.lock = threading.Lock()
+        self.terms = {}
+        self.ids = {}
+        self.cache = {}
+
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                # Індекс іншого магазину не використовується
+                if data.get("shop_url") == shop_url:
+                    self.cache = {int(attr_id): terms for attr_id, terms in data.get("attributes", {}).items()}
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Не вдалося прочитати індекс термінів {path}: {e}")
+
+    # Чи завантажений індекс атрибуту в цьому процесі
+    def loaded(self, attr_id):
+        with self.lock:
+            return attr_id in self.terms
+
+    # Чи є збережений з попереднього запуску індекс атрибуту
+    def cached(self, attr_id):
+        return attr_id in self.cache
+
+    # Перевірка збереженого індексу за кількістю термінів у магазині та ID найновішого терміну.
+    # Якщо вони збігаються, збережений індекс стає робочим і повертається True
+    def revalidate(self, attr_id, total, last_id):
+        terms = self.cache.get(attr_id)
+        if terms is None or total != len(terms) or last_id != max((term_id for term_id, _ in terms), default=0):
+            return False
+        self.replace(attr_id, terms)
+        return True
+
+    # Заміна індексу атрибуту повним списком термінів [(ID, назва), ...]
+    def replace(self, attr_id, terms):
+        with self.lock:
+            self.ids[attr_id] = {}
+            self.terms[attr_id] = {}
+            for term_id, name in terms:
+                self.ids[attr_id][term_id] = name
+                self.terms[attr_id].setdefault(normalize_name(name), term_id)
+
+    # ID терміну за назвою (None, якщо терміну немає)
+    def get(self, attr_id, name):
+        with self.lock:
+            return self.terms.get(attr_id, {}).get(normalize_name(name))
+
+    # Додавання створеного (або знайденого через term_exists) терміну
+    def add(self, attr_id, name, term_id):
+        with self.lock:
+            self.ids.setdefault(attr_id, {})[term_id] = name
+            self.terms.setdefault(attr_id, {})[normalize_name(name)] = term_id
+
+    # Збереження індексу на диск (через тимчасовий файл, щоб не залишити половину файлу)
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            attributes = dict(self.cache)
+            attributes.update({attr_id: sorted(ids.items()) for attr_id, ids in self.ids.items()})
+            data = {"shop_url": self.shop_url, "attributes": {str(attr_id): terms for attr_id, terms in attributes.items()}}
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)